@@ -0,0 +1,371 @@
+"""
+A benchmark suite for the thumbnail pipeline.
+
+The fixture images are generated on the fly so the benchmarks can be run
+offline, usually with the ``thumbnail_benchmark`` management command. The
+results are a JSON-serializable dictionary so that runs from different
+versions (of easy-thumbnails, PIL or Django) can be compared.
+
+"""
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.template import Context, Template
+from easy_thumbnails import engine, models, processors, utils
+from easy_thumbnails.files import Thumbnailer, get_thumbnailer
+from easy_thumbnails.source_generators import pil_image
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    import Image
+    import ImageDraw
+from StringIO import StringIO
+from timeit import default_timer
+import django
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The generated fixture images: (name, mode, size, format).
+FIXTURES = (
+    ('small-rgb', 'RGB', (320, 240), 'JPEG'),
+    ('large-rgb', 'RGB', (3000, 2000), 'JPEG'),
+    ('greyscale', 'L', (1600, 1200), 'JPEG'),
+    ('cmyk', 'CMYK', (1600, 1200), 'JPEG'),
+    ('rgba', 'RGBA', (1024, 768), 'PNG'),
+    ('palette', 'P', (1024, 768), 'GIF'),
+)
+
+# The processors benchmarked against each fixture: (name, processor,
+# options).
+PROCESSORS = (
+    ('colorspace', processors.colorspace, {}),
+    ('colorspace(bw)', processors.colorspace, {'bw': True}),
+    ('autocrop', processors.autocrop, {'autocrop': True}),
+    ('autocrop(fast)', processors.autocrop, {'autocrop': 'fast'}),
+    ('scale_and_crop', processors.scale_and_crop, {'size': (200, 200)}),
+    ('scale_and_crop(crop)', processors.scale_and_crop,
+     {'size': (200, 200), 'crop': True}),
+    ('scale_and_crop(smart)', processors.scale_and_crop,
+     {'size': (200, 200), 'crop': 'smart'}),
+    ('filters(sharpen)', processors.filters, {'sharpen': True}),
+    ('filters(detail)', processors.filters, {'detail': True}),
+)
+
+THUMBNAIL_OPTIONS = {'size': (100, 100), 'crop': True}
+
+TAG_TEMPLATE = '{% load thumbnail %}{% thumbnail source 100x100 crop %}'
+
+
+class BenchmarkStorage(FileSystemStorage):
+    """
+    The temporary storage used by the benchmarks.
+
+    Storage hashes are based on the storage class, so this separate class
+    keeps the benchmarks' cache references apart from those of the project's
+    own ``FileSystemStorage`` instances.
+
+    """
+
+
+def make_fixture(mode, size, format):
+    """
+    Return the data of a generated fixture image.
+
+    The image is a gradient with some concentric rings (so there is detail
+    for the encoders and the entropy based cropping to work with) on a white
+    border (for ``autocrop``).
+
+    """
+    gradient = Image.new('RGB', (256, 256))
+    gradient.putdata([(x, y, (x + y) // 2)
+                      for y in range(256) for x in range(256)])
+    width, height = size
+    border = max(width, height) // 20
+    inner = (width - border * 2, height - border * 2)
+    image = Image.new('RGB', size, (255, 255, 255))
+    image.paste(gradient.resize(inner, Image.BILINEAR), (border, border))
+    draw = ImageDraw.Draw(image)
+    for i in range(2, 8):
+        x, y = width * i // 16, height * i // 16
+        draw.ellipse((x, y, width - x, height - y),
+                     outline=(255 * (i % 2), 0, 128))
+    del draw
+    if mode == 'RGBA':
+        image.putalpha(gradient.convert('L').resize(size))
+    elif mode != 'RGB':
+        image = image.convert(mode)
+    data = StringIO()
+    image.save(data, format)
+    return data.getvalue()
+
+
+def get_fixtures(names=None):
+    """
+    Return a list of the generated fixtures as dictionaries (containing the
+    fixture ``name``, ``mode``, ``size``, ``format`` and image ``data``),
+    optionally limited to those in ``names``.
+
+    """
+    fixtures = []
+    for name, mode, size, format in FIXTURES:
+        if names is not None and name not in names:
+            continue
+        fixtures.append({'name': name, 'mode': mode, 'size': size,
+                         'format': format,
+                         'data': make_fixture(mode, size, format)})
+    return fixtures
+
+
+def get_benchmarks(fixtures, storage):
+    """
+    Return a list of benchmarks for the ``fixtures`` as ``(name, function,
+    reset)`` tuples, where ``reset`` is ``None`` or a function to call
+    (untimed) before each call of ``function``.
+
+    The sources used by the storage related benchmarks are saved to
+    ``storage``.
+
+    """
+    benchmarks = []
+    for fixture in fixtures:
+        label = '[%s]' % fixture['name']
+        data = fixture['data']
+        image = Image.open(StringIO(data))
+        image.load()
+        # The other processors get the image as colorspace leaves it, as they
+        # would in the default pipeline.
+        converted = processors.colorspace(image)
+        benchmarks.append(('pil_image' + label, _pil_image(data), None))
+        for name, processor, options in PROCESSORS:
+            if processor is processors.colorspace:
+                source = image
+            else:
+                source = converted
+            benchmarks.append(('processors.%s%s' % (name, label),
+                               _process(processor, source, options), None))
+        if fixture['format'] == 'JPEG':
+            filename = 'benchmark.jpg'
+        else:
+            filename = 'benchmark.png'
+        benchmarks.append(('save_image' + label,
+                           _save_image(image, filename), None))
+        source_name = storage.save(
+            '%s.%s' % (fixture['name'], fixture['format'].lower()),
+            ContentFile(data))
+        thumbnail_name = _thumbnailer(storage, source_name).get_thumbnail(
+            THUMBNAIL_OPTIONS).name
+        benchmarks.append(('thumbnail_exists' + label,
+                           _thumbnail_exists(storage, source_name,
+                                             thumbnail_name), None))
+        benchmarks.append(('template_tag' + label,
+                           _render_tag(storage, source_name), None))
+        benchmarks.append(('template_tag(generate)' + label,
+                           _render_tag(storage, source_name),
+                           _deleter(storage, thumbnail_name)))
+    benchmarks.append(('get_thumbnail_name',
+                       _thumbnail_name(storage, 'source.jpg'), None))
+    return benchmarks
+
+
+def _pil_image(data):
+    return lambda: pil_image(StringIO(data))
+
+
+def _process(processor, image, options):
+    return lambda: processor(image, **options)
+
+
+def _save_image(image, filename):
+    if filename.endswith('.jpg') and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    return lambda: engine.save_image(image, StringIO(), filename=filename,
+                                     quality=85)
+
+
+def _thumbnailer(storage, name):
+    thumbnailer = get_thumbnailer(storage, name)
+    thumbnailer.thumbnail_storage = storage
+    return thumbnailer
+
+
+def _thumbnail_name(storage, name):
+    thumbnailer = Thumbnailer(None, name=name, source_storage=storage,
+                              thumbnail_storage=storage)
+    return lambda: thumbnailer.get_thumbnail_name(THUMBNAIL_OPTIONS)
+
+
+def _thumbnail_exists(storage, source_name, thumbnail_name):
+    # A new thumbnailer each time, since they memoize the source details.
+    return lambda: _thumbnailer(storage, source_name).thumbnail_exists(
+        thumbnail_name)
+
+
+def _render_tag(storage, source_name):
+    template = Template(TAG_TEMPLATE)
+    return lambda: template.render(Context({
+        'source': _thumbnailer(storage, source_name)}))
+
+
+def _deleter(storage, name):
+    def reset():
+        if storage.exists(name):
+            storage.delete(name)
+    return reset
+
+
+def time_calls(function, iterations, reset=None):
+    """
+    Call ``function`` ``iterations`` times, returning a dictionary of the
+    ``min``, ``median`` and ``mean`` times (in seconds) the calls took.
+
+    """
+    timings = []
+    for i in range(iterations):
+        if reset:
+            reset()
+        start = default_timer()
+        function()
+        timings.append(default_timer() - start)
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'min': timings[0],
+        'median': timings[len(timings) // 2],
+        'mean': sum(timings) / len(timings),
+    }
+
+
+def get_peak_memory():
+    """
+    Return the peak resident memory of this process in KiB, or ``None`` if it
+    is unknown on this platform.
+
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Reported in bytes rather than kilobytes.
+        peak //= 1024
+    return peak
+
+
+def measure(function, iterations, reset=None):
+    """
+    Time ``function`` (see ``time_calls``), also recording the growth in peak
+    resident memory while it ran as ``peak_memory`` (in KiB).
+
+    """
+    start_memory = get_peak_memory()
+    result = time_calls(function, iterations, reset)
+    if start_memory is None:
+        result['peak_memory'] = None
+    else:
+        result['peak_memory'] = get_peak_memory() - start_memory
+    return result
+
+
+def _measure_in_child(connection, function, iterations, reset):
+    try:
+        connection.send(measure(function, iterations, reset))
+    except Exception, e:
+        connection.send(e)
+    connection.close()
+
+
+def measure_isolated(function, iterations, reset=None):
+    """
+    Run ``measure`` in a forked child process, so that the peak memory is
+    that of this benchmark alone (a process's peak memory never goes down).
+
+    The child shares the database connection, which is safe since this
+    process waits for the child to exit (without cleaning up the connection)
+    before using it again.
+
+    """
+    parent_connection, child_connection = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(
+        target=_measure_in_child,
+        args=(child_connection, function, iterations, reset))
+    process.start()
+    result = parent_connection.recv()
+    process.join()
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def get_environment():
+    """
+    Return a dictionary describing the versions the benchmarks were run with.
+
+    """
+    import easy_thumbnails
+    return {
+        'easy_thumbnails': easy_thumbnails.get_version(),
+        'django': django.get_version(),
+        'pil': getattr(Image, 'PILLOW_VERSION', None) or
+               getattr(Image, 'VERSION', None),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def run(iterations=10, fixtures=None, match=None, isolate=True):
+    """
+    Run the benchmarks, returning a JSON-serializable dictionary with the
+    ``environment`` and the ``benchmarks`` results (keyed by benchmark name).
+
+    ``fixtures`` optionally limits the fixture images used (by name), and
+    ``match`` the benchmarks run to those whose name contains it. Unless
+    ``isolate`` is ``False`` (or the platform can't fork), each benchmark is
+    run in its own process to measure its peak memory.
+
+    """
+    if isolate and not hasattr(os, 'fork'):
+        isolate = False
+    location = tempfile.mkdtemp()
+    storage = BenchmarkStorage(location=location,
+                              base_url='/benchmark-media/')
+    results = {}
+    try:
+        benchmarks = get_benchmarks(get_fixtures(fixtures), storage)
+        for name, function, reset in benchmarks:
+            if match and match not in name:
+                continue
+            if isolate:
+                results[name] = measure_isolated(function, iterations, reset)
+            else:
+                results[name] = measure(function, iterations, reset)
+    finally:
+        # Remove the cache references of the temporary files too (only the
+        # benchmark storage class has this hash).
+        models.Source.objects.filter(
+            storage_hash=utils.get_storage_hash(storage)).delete()
+        shutil.rmtree(location)
+    return {'environment': get_environment(), 'benchmarks': results}
+
+
+def compare(previous, current, key='median'):
+    """
+    Compare two sets of results (as returned by ``run``), returning a sorted
+    list of ``(name, previous time, current time, ratio)`` tuples for the
+    benchmarks found in both.
+
+    """
+    comparison = []
+    previous = previous['benchmarks']
+    for name, result in sorted(current['benchmarks'].items()):
+        if name not in previous:
+            continue
+        before, after = previous[name][key], result[key]
+        ratio = before and after / before or None
+        comparison.append((name, before, after, ratio))
+    return comparison
@@ -7,10 +7,13 @@ MEDIA_URL = ''
 BASEDIR = ''
 SUBDIR = ''
 PREFIX = ''
+SHARD_DEPTH = 0
+HASHED_NAMES = False
 
 QUALITY = 85
 EXTENSION = 'jpg'
 TRANSPARENCY_EXTENSION = 'png'
+OPTIMIZE = False
 PROCESSORS = (
     'easy_thumbnails.processors.colorspace',
     'easy_thumbnails.processors.autocrop',
@@ -19,4 +22,28 @@ PROCESSORS = (
 )
 SOURCE_GENERATORS = (
     'easy_thumbnails.source_generators.pil_image',
-)
\ No newline at end of file
+)
+
+MAX_SOURCE_PIXELS = None
+MAX_SOURCE_BYTES = None
+OVERSIZE_POLICY = 'reject'
+
+WORKER_PROCESSES = 0
+WORKER_TIMEOUT = 30
+
+THREADS = 10
+
+METRICS = None
+METRICS_PREFIX = 'easy_thumbnails'
+
+PROFILE_THRESHOLD = None
+PROFILE_DIR = None
+
+LAZY_URL = None
+
+VIEW_CACHE_SECONDS = 60 * 60 * 24
+
+PLACEHOLDER = None
+PLACEHOLDER_URL = ''
+
+SOURCE_PREVIEWS = False
@@ -2,7 +2,8 @@ try:
     from PIL import Image
 except ImportError:
     import Image
-from easy_thumbnails import utils
+from easy_thumbnails import metrics, processors as builtin_processors, \
+    profiling, utils
 import os
 try:
     from cStringIO import StringIO
@@ -10,12 +11,78 @@ except ImportError:
     from StringIO import StringIO
 
 
+class NoSourceGenerator(Exception):
+    """
+    Exception that is raised if no source generator can process the source
+    file.
+
+    """
+
+
 DEFAULT_PROCESSORS = [utils.dynamic_import(p)
                       for p in utils.get_setting('PROCESSORS')]
 
 SOURCE_GENERATORS = [utils.dynamic_import(p)
                      for p in utils.get_setting('SOURCE_GENERATORS')]
 
+# Source image modes which can be resampled before being converted by the
+# colorspace processor without noticeably altering the resulting thumbnail.
+DEFERRED_COLORSPACE_MODES = ('CMYK', 'YCbCr')
+
+_pipelines = {}
+
+
+def get_pipeline(processor_options, processors=None, mode=None):
+    """
+    Return the list of image processors which need to be run for the given
+    options, leaving out any processor which wouldn't alter the image.
+
+    If the ``mode`` of the source image is provided and is one of
+    ``DEFERRED_COLORSPACE_MODES``, the colorspace conversion is moved after
+    the image is scaled so that it works on far fewer pixels.
+
+    Pipelines are cached per list of processors, set of used options and
+    whether the colorspace conversion is deferred.
+
+    """
+    if processors is None:
+        processors = DEFAULT_PROCESSORS
+    used_options = [key for key, value in processor_options.items() if value]
+    used_options.sort()
+    # Smart cropping measures the entropy of the image, which depends on its
+    # colorspace.
+    defer_colorspace = (mode in DEFERRED_COLORSPACE_MODES and
+                        processor_options.get('crop') != 'smart')
+    key = (tuple(processors), tuple(used_options), defer_colorspace)
+    pipeline = _pipelines.get(key)
+    if pipeline is None:
+        pipeline = []
+        for processor in processors:
+            active_options = utils.active_processor_options(processor)
+            if active_options is not None:
+                active = [option for option in active_options
+                          if option in used_options]
+                if not active:
+                    continue
+            pipeline.append(processor)
+        if defer_colorspace:
+            _defer_colorspace(pipeline)
+        _pipelines[key] = pipeline
+    return pipeline
+
+
+def _defer_colorspace(pipeline):
+    """
+    Swap the colorspace processor with the scale and crop processor if it is
+    run directly before it.
+
+    """
+    for i in range(len(pipeline) - 1):
+        if (pipeline[i] is builtin_processors.colorspace and
+                pipeline[i + 1] is builtin_processors.scale_and_crop):
+            pipeline[i], pipeline[i + 1] = pipeline[i + 1], pipeline[i]
+            return
+
 
 def process_image(source, processor_options, processors=None):
     """
@@ -23,11 +90,12 @@ def process_image(source, processor_options, processors=None):
     the (potentially) altered image.
     
     """
-    if processors is None:
-        processors = DEFAULT_PROCESSORS
     image = source
-    for processor in processors:
+    started = metrics.start()
+    for processor in get_pipeline(processor_options, processors,
+                                  mode=source.mode):
         image = processor(image, **processor_options)
+        started = metrics.timing('process', started, processor=processor)
     return image
 
 
@@ -36,24 +104,77 @@ def save_image(image, destination=None, filename=None, **options):
     Save a PIL image.
     
     """
+    started = metrics.start()
     if destination is None:
         destination = StringIO()
-    filename = filename or ''
-    format = Image.EXTENSION.get(os.path.splitext(filename)[1], 'JPEG')
+    format = get_format(filename)
     if format == 'JPEG':
         options.setdefault('quality', 85)
+        options.setdefault('optimize', 1)
+    if options.get('optimize'):
         try:
-            image.save(destination, format=format, optimize=1, **options)
+            image.save(destination, format=format, **options)
         except IOError:
             # Try again, without optimization (PIL can't optimize an image
             # larger than ImageFile.MAXBLOCK, which is 64k by default)
-            pass
-    image.save(destination, format=format, **options)
+            del options['optimize']
+            if hasattr(destination, 'truncate'):
+                destination.seek(0)
+                destination.truncate()
+            image.save(destination, format=format, **options)
+    else:
+        image.save(destination, format=format, **options)
     if hasattr(destination, 'seek'):
         destination.seek(0)
+    metrics.timing('encode', started)
     return destination
 
 
+def get_format(filename=None):
+    """
+    Return the PIL image format which will be used to save a file with the
+    given filename (defaulting to JPEG).
+
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension not in Image.EXTENSION:
+        # PIL only registers the extensions of all its plugins once they have
+        # been initialized.
+        Image.init()
+    return Image.EXTENSION.get(extension, 'JPEG')
+
+
+def optimize_image(image, format=None):
+    """
+    Losslessly reduce the encoded size of a PIL image before it is saved.
+
+    Any metadata other than the transparency information is stripped, and
+    opaque PNG images which use no more than 256 colors are converted to a
+    palette image (which PIL encodes using far fewer bytes per pixel).
+
+    The image passed in is left untouched (a new image is returned if anything
+    needs changing).
+
+    """
+    info = dict([(key, value) for key, value in image.info.items()
+                 if key == 'transparency'])
+    if info != image.info:
+        image = image.copy()
+        image.info = info
+    if format == 'PNG' and image.mode == 'RGB':
+        colors = image.getcolors(256)
+        if colors:
+            palette = []
+            for count, color in colors:
+                palette.extend(color)
+            palette_image = Image.new('P', (1, 1))
+            palette_image.putpalette(palette)
+            # Every color is in the palette, so the conversion is exact.
+            image = image.quantize(palette=palette_image)
+            image.info = info
+    return image
+
+
 def generate_source_image(source, processor_options, generators=None):
     """
     Processes a source file through a series of source generators, stopping
@@ -67,11 +188,59 @@ def generate_source_image(source, processor_options, generators=None):
     source.open()
     if generators is None:
         generators = SOURCE_GENERATORS
+    started = metrics.start()
     try:
         for generator in generators:
             image = generator(source, **processor_options)
             if image:
+                metrics.timing('decode', started)
                 return image
     finally:
         if was_closed:
             source.close()
+
+
+def generate_thumbnail(source, thumbnail_options, filenames, quality,
+                       optimize=False, source_callback=None):
+    """
+    Generate a thumbnail image from a source file.
+
+    ``filenames`` is a tuple of the thumbnail filename to use for an opaque
+    image and the one to use for a transparent image (the filename extension
+    determines the format the image is saved in).
+
+    ``source_callback`` is an optional function which is called with the
+    decoded source image before it is processed (for example, to compute a
+    preview of the source in the same pass).
+
+    Returns a tuple containing the thumbnail filename, the saved image data
+    and the PIL image. ``NoSourceGenerator`` is raised if the source couldn't
+    be read as an image.
+
+    Slow generation is profiled if the ``THUMBNAIL_PROFILE_THRESHOLD`` setting
+    is set (see ``easy_thumbnails.profiling``).
+
+    """
+    profile = profiling.start()
+    image = None
+    try:
+        image = generate_source_image(source, thumbnail_options)
+        if image is None:
+            raise NoSourceGenerator("Tried %s source generators with no "
+                                    "success" % len(SOURCE_GENERATORS))
+        if source_callback:
+            source_callback(image)
+        thumbnail_image = process_image(image, thumbnail_options)
+        filename = filenames[utils.is_transparent(thumbnail_image)]
+
+        save_options = {'quality': quality}
+        if optimize:
+            thumbnail_image = optimize_image(thumbnail_image,
+                                             get_format(filename))
+            save_options['optimize'] = 1
+
+        data = save_image(thumbnail_image, filename=filename,
+                          **save_options).read()
+    finally:
+        profiling.finish(profile, source, image, thumbnail_options)
+    return filename, data, thumbnail_image
@@ -2,9 +2,13 @@ from django.core.files.base import File, ContentFile
 from django.core.files.storage import get_storage_class, default_storage, \
     Storage
 from django.db.models.fields.files import ImageFieldFile, FieldFile
+from django.utils.encoding import smart_str
+from django.utils.hashcompat import md5_constructor
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
-from easy_thumbnails import engine, models, utils
+from easy_thumbnails import engine, metrics, models, placeholders, pool, \
+    source_generators, utils
+from easy_thumbnails.storage import delete_files
 import datetime
 import os
 import urllib2, shutil
@@ -59,18 +63,62 @@ def get_thumbnailer(source, relative_name=None):
                     'File or Storage instance.')
 
 
+def delete_thumbnails_for(queryset, field_names=None, chunk_size=500):
+    """
+    Delete the thumbnails of all the source files referenced by the
+    ``ThumbnailerField`` (or ``ThumbnailerImageField``) fields of a queryset's
+    model instances, returning the number of thumbnails deleted.
+
+    Use ``field_names`` to limit which fields are used. The thumbnails are
+    looked up and deleted in chunks of ``chunk_size`` source files, with
+    each chunk's files deleted from storage using a single
+    :func:`~easy_thumbnails.storage.delete_files` call.
+
+    """
+    from easy_thumbnails.fields import ThumbnailerField
+    deleted = 0
+    for field in queryset.model._meta.fields:
+        if not isinstance(field, ThumbnailerField):
+            continue
+        if field_names is not None and field.name not in field_names:
+            continue
+        source_storage_hash = utils.get_storage_hash(field.storage)
+        thumbnail_storage = (field.thumbnail_storage or
+                             DEFAULT_THUMBNAIL_STORAGE)
+        thumbnail_storage_hash = utils.get_storage_hash(thumbnail_storage)
+        names = [name for name in
+                 queryset.values_list(field.attname, flat=True) if name]
+        for i in range(0, len(names), chunk_size):
+            thumbnails = list(models.Thumbnail.objects.filter(
+                source__storage_hash=source_storage_hash,
+                source__name__in=names[i:i + chunk_size],
+                storage_hash=thumbnail_storage_hash).values_list('pk', 'name'))
+            if not thumbnails:
+                continue
+            deleted_names = set(delete_files(
+                thumbnail_storage, [name for pk, name in thumbnails]))
+            deleted_pks = [pk for pk, name in thumbnails
+                           if name in deleted_names]
+            models.Thumbnail.objects.filter(pk__in=deleted_pks).delete()
+            deleted += len(deleted_pks)
+    return deleted
+
+
 def save_thumbnail(thumbnail_file, storage):
     """
     Save a thumbnailed file, returning the saved relative file name.
 
     """
+    started = metrics.start()
     filename = thumbnail_file.name
     if storage.exists(filename):
         try:
             storage.delete(filename)
         except:
             pass
-    return storage.save(filename, thumbnail_file)
+    filename = storage.save(filename, thumbnail_file)
+    metrics.timing('save', started)
+    return filename
 
 
 class FakeField(object):
@@ -187,6 +235,12 @@ class ThumbnailFile(ImageFieldFile):
 
     url = property(_get_url)
 
+    def _get_placeholder(self):
+        return placeholders.get_placeholder_url(self.thumbnailer,
+                                                self.thumbnail_options)
+
+    placeholder = property(_get_placeholder)
+
     def open(self, mode=None, *args, **kwargs):
         if self.closed and self.name:
             self.file = self.storage.open(self.name, mode or self.mode or 'rb')
@@ -194,6 +248,94 @@ class ThumbnailFile(ImageFieldFile):
             return super(ThumbnailFile, self).open(mode, *args, **kwargs)
 
 
+class LazyThumbnailFile(object):
+    """
+    A stand-in for the ``ThumbnailFile`` returned by a thumbnailer's
+    ``get_thumbnail`` method, which is only called (checking whether the
+    thumbnail exists and generating it if not) once one of the thumbnail
+    file's attributes is used.
+
+    If the ``THUMBNAIL_LAZY_URL`` setting is set, the ``url`` is built by that
+    function rather than getting the thumbnail (if the function returns
+    ``None``, the thumbnail is got after all). Otherwise using the ``url``
+    gets the thumbnail too, so it is only deferred until the ``url`` is used.
+
+    If ``fail_silently`` is ``True``, any error getting the thumbnail (or
+    building its URL) is ignored, leaving this object false with empty
+    attributes (other than the ``url``, which is then the placeholder's, see
+    ``THUMBNAIL_PLACEHOLDER``).
+
+    The ``placeholder`` is the URL of the thumbnail's placeholder, for use
+    while the thumbnail at a lazy ``url`` is still to be generated.
+
+    """
+    def __init__(self, thumbnailer, thumbnail_options, fail_silently=False):
+        self.thumbnailer = thumbnailer
+        self.thumbnail_options = thumbnail_options
+        self.fail_silently = fail_silently
+        self._thumbnail = None
+        self._resolved = False
+
+    def get_thumbnail(self):
+        """
+        Return the ``ThumbnailFile`` (or ``None`` if it failed silently).
+
+        """
+        if not self._resolved:
+            try:
+                self._thumbnail = self.thumbnailer.get_thumbnail(
+                    self.thumbnail_options)
+            except:
+                if not self.fail_silently:
+                    raise
+            self._resolved = True
+        return self._thumbnail
+
+    def _get_url(self):
+        lazy_url = utils.get_setting('LAZY_URL')
+        if lazy_url and not self._resolved:
+            try:
+                url = utils.dynamic_import(lazy_url)(self.thumbnailer,
+                                                     self.thumbnail_options)
+            except:
+                if not self.fail_silently:
+                    raise
+                return placeholders.get_placeholder_url(
+                    self.thumbnailer, self.thumbnail_options)
+            if url is not None:
+                return url
+        thumbnail = self.get_thumbnail()
+        if thumbnail is None:
+            return placeholders.get_placeholder_url(self.thumbnailer,
+                                                    self.thumbnail_options)
+        return thumbnail.url
+
+    url = property(_get_url)
+
+    def _get_placeholder(self):
+        return placeholders.get_placeholder_url(self.thumbnailer,
+                                                self.thumbnail_options)
+
+    placeholder = property(_get_placeholder)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        thumbnail = self.get_thumbnail()
+        if thumbnail is None:
+            return ''
+        return getattr(thumbnail, name)
+
+    def __nonzero__(self):
+        return bool(self.get_thumbnail())
+
+    def __unicode__(self):
+        return unicode(self.get_thumbnail() or '')
+
+    def __str__(self):
+        return str(self.get_thumbnail() or '')
+
+
 class Thumbnailer(File):
     """
     A file-like object which provides some methods to generate thumbnail
@@ -207,6 +349,9 @@ class Thumbnailer(File):
         * thumbnail_prefix
         * thumbnail_quality
         * thumbnail_extension
+        * thumbnail_optimize
+        * thumbnail_shard_depth
+        * thumbnail_hashed_names
 
     """
     thumbnail_basedir = utils.get_setting('BASEDIR')
@@ -216,6 +361,9 @@ class Thumbnailer(File):
     thumbnail_extension = utils.get_setting('EXTENSION')
     thumbnail_transparency_extension = utils.get_setting(
                                                     'TRANSPARENCY_EXTENSION')
+    thumbnail_optimize = utils.get_setting('OPTIMIZE')
+    thumbnail_shard_depth = utils.get_setting('SHARD_DEPTH')
+    thumbnail_hashed_names = utils.get_setting('HASHED_NAMES')
 
     def __init__(self, file, name=None, source_storage=None,
                  thumbnail_storage=None, *args, **kwargs):
@@ -223,14 +371,19 @@ class Thumbnailer(File):
         self.source_storage = source_storage or default_storage
         self.thumbnail_storage = (thumbnail_storage or
                                   DEFAULT_THUMBNAIL_STORAGE)
+        self._source_memo = {}
 
-    def generate_thumbnail(self, thumbnail_options):
+    def generate_thumbnail(self, thumbnail_options, preview=False):
         """
         Return a ``ThumbnailFile`` containing a thumbnail image.
 
         The thumbnail image is generated using the ``thumbnail_options``
         dictionary.
 
+        If ``preview`` is ``True``, a preview of the source image is computed
+        from the same decode and set as the thumbnail's ``source_preview``
+        attribute (see ``easy_thumbnails.placeholders.make_preview``).
+
         """
         if not utils.is_storage_local(self.source_storage):
             # Get a local copy of the source file
@@ -240,19 +393,41 @@ class Thumbnailer(File):
             tmp_image_f.seek(0)
             self.file = tmp_image_f
 
-        image = engine.generate_source_image(self, thumbnail_options)
-        thumbnail_image = engine.process_image(image, thumbnail_options)
         quality = thumbnail_options.get('quality', self.thumbnail_quality)
-
-        filename = self.get_thumbnail_name(thumbnail_options,
-                            transparent=self.is_transparent(thumbnail_image))
-
-        data = engine.save_image(thumbnail_image, filename=filename,
-                                 quality=quality).read()
+        filenames = (
+            self.get_thumbnail_name(thumbnail_options, transparent=False),
+            self.get_thumbnail_name(thumbnail_options, transparent=True))
+
+        result = None
+        source_preview = None
+        if pool.is_enabled():
+            result = pool.generate(self.read_source(), thumbnail_options,
+                                   filenames, quality, self.thumbnail_optimize,
+                                   preview=preview)
+        if result:
+            if preview:
+                filename, data, source_preview = result
+            else:
+                filename, data = result
+            thumbnail_image = None
+        else:
+            previews = []
+            if preview:
+                source_callback = placeholders.preview_callback(previews)
+            else:
+                source_callback = None
+            filename, data, thumbnail_image = engine.generate_thumbnail(
+                self, thumbnail_options, filenames, quality,
+                optimize=self.thumbnail_optimize,
+                source_callback=source_callback)
+            if previews:
+                source_preview = previews[0]
 
         thumbnail = ThumbnailFile(filename, ContentFile(data),
                                   storage=self.thumbnail_storage)
-        thumbnail.image = thumbnail_image
+        if thumbnail_image:
+            thumbnail.image = thumbnail_image
+        thumbnail.source_preview = source_preview
         thumbnail._committed = False
 
         return thumbnail
@@ -263,16 +438,49 @@ class Thumbnailer(File):
         dictionary and ``source_name`` (which defaults to the File's ``name``
         if not provided).
 
+        If ``thumbnail_hashed_names`` is set, the filename is a fixed length
+        digest of the source name and options rather than containing them.
+
         """
         path, source_filename = os.path.split(self.name)
         source_extension = os.path.splitext(source_filename)[1][1:]
-        filename = '%s%s' % (self.thumbnail_prefix, source_filename)
         if transparent:
             extension = self.thumbnail_transparency_extension
         else:
             extension = self.thumbnail_extension
         extension = extension or 'jpg'
 
+        all_opts = self.get_options_string(thumbnail_options)
+
+        data = {'opts': all_opts}
+        basedir = self.thumbnail_basedir % data
+        subdir = self.thumbnail_subdir % data
+
+        if self.thumbnail_hashed_names:
+            filename = '%s%s.%s' % (self.thumbnail_prefix,
+                                    self.get_digest(all_opts), extension)
+        else:
+            filename_parts = ['%s%s' % (self.thumbnail_prefix,
+                                        source_filename)]
+            if ('%(opts)s' in self.thumbnail_basedir or
+                '%(opts)s' in self.thumbnail_subdir):
+                if extension != source_extension:
+                    filename_parts.append(extension)
+            else:
+                filename_parts += [all_opts, extension]
+            filename = '.'.join(filename_parts)
+
+        parts = [basedir, path, subdir]
+        parts.extend(self.get_shard_dirs(all_opts))
+        parts.append(filename)
+        return os.path.join(*parts)
+
+    def get_options_string(self, thumbnail_options):
+        """
+        Return the canonical string representation of a ``thumbnail_options``
+        dictionary, for example ``'100x100_q85_crop_sharpen'``.
+
+        """
         thumbnail_options = thumbnail_options.copy()
         size = tuple(thumbnail_options.pop('size'))
         quality = thumbnail_options.pop('quality', self.thumbnail_quality)
@@ -283,22 +491,33 @@ class Thumbnailer(File):
         opts = ['%s' % (v is not True and '%s-%s' % (k, v) or k)
                 for k, v in opts if v]
 
-        all_opts = '_'.join(initial_opts + opts)
+        return '_'.join(initial_opts + opts)
 
-        data = {'opts': all_opts}
-        basedir = self.thumbnail_basedir % data
-        subdir = self.thumbnail_subdir % data
+    def get_digest(self, options_string):
+        """
+        Return a hexadecimal digest of the source name and a canonical
+        thumbnail options string.
 
-        filename_parts = [filename]
-        if ('%(opts)s' in self.thumbnail_basedir or
-            '%(opts)s' in self.thumbnail_subdir):
-            if extension != source_extension:
-                filename_parts.append(extension)
-        else:
-            filename_parts += [all_opts, extension]
-        filename = '.'.join(filename_parts)
+        """
+        return md5_constructor(smart_str('%s:%s' % (self.name,
+                                                    options_string))
+                               ).hexdigest()
 
-        return os.path.join(basedir, path, subdir, filename)
+    def get_shard_dirs(self, options_string):
+        """
+        Return a list of ``thumbnail_shard_depth`` nested directory names
+        (each two hexadecimal characters), determined by a hash of the source
+        name and the thumbnail options.
+
+        This spreads a directory's thumbnails evenly over up to 256 times as
+        many sub-directories for each level of depth.
+
+        """
+        depth = self.thumbnail_shard_depth
+        if not depth:
+            return []
+        digest = self.get_digest(options_string)
+        return [digest[i * 2:i * 2 + 2] for i in range(depth)]
 
     def get_thumbnail(self, thumbnail_options, save=True):
         """
@@ -310,6 +529,15 @@ class Thumbnailer(File):
         ``thumbnail_options`` dictionary. If the ``save`` argument is ``True``
         (default), the generated thumbnail will be saved too.
 
+        ``engine.NoSourceGenerator`` is raised if the source can't be read as
+        an image. When saving, this is remembered (until the source file is
+        modified) so that following attempts fail without reading the source
+        again.
+
+        If the ``THUMBNAIL_SOURCE_PREVIEWS`` setting is ``True``, a preview of
+        the source is computed while generating (and saving) the first
+        thumbnail of a source, and stored on its cache reference.
+
         """
         opaque_name = self.get_thumbnail_name(thumbnail_options,
                                               transparent=False)
@@ -321,18 +549,34 @@ class Thumbnailer(File):
             names = (opaque_name, transparent_name)
         for filename in names:
             if self.thumbnail_exists(filename):
+                metrics.existence_checked(filename, True)
                 thumbnail = ThumbnailFile(name=filename,
                                           storage=self.thumbnail_storage)
                 return thumbnail
+        metrics.existence_checked(opaque_name, False)
 
-        thumbnail = self.generate_thumbnail(thumbnail_options)
+        if save and self.source_unreadable():
+            raise engine.NoSourceGenerator("The source couldn't be read as "
+                                           "an image")
+        preview = save and self.source_preview_wanted()
+        try:
+            thumbnail = self.generate_thumbnail(thumbnail_options,
+                                                preview=preview)
+        except engine.NoSourceGenerator:
+            if save:
+                self.set_source_unreadable(True)
+            raise
         if save:
+            self.set_source_unreadable(False)
+            if thumbnail.source_preview:
+                self.set_source_preview(*thumbnail.source_preview)
             save_thumbnail(thumbnail, self.thumbnail_storage)
             # Ensure the right thumbnail name is used based on the transparency
             # of the image.
             filename = (self.is_transparent(thumbnail) and transparent_name or
                         opaque_name)
-            self.get_thumbnail_cache(filename, create=True, update=True)
+            self.get_thumbnail_cache(filename, create=True, update=True,
+                options=self.get_options_string(thumbnail_options))
 
         return thumbnail
 
@@ -360,33 +604,198 @@ class Thumbnailer(File):
         thumbnail = self.get_thumbnail_cache(thumbnail_name)
         return thumbnail and source.modified <= thumbnail.modified
 
-    def get_source_cache(self, create=False, update=False):
+    def get_source_cache(self, create=False, update=False, query=True):
+        """
+        Return the cached ``Source`` reference for this file.
+
+        The reference is memoized for the lifetime of this instance, so the
+        database is only queried again when the reference needs creating or
+        its modification date updating (see ``invalidate_source_cache``). If
+        ``query`` is ``False``, only a memoized reference is returned (or
+        ``None``).
+
+        """
+        memo = self._source_memo
+        if 'source' in memo and not update:
+            source = memo['source']
+            if source or not create:
+                return source
+        if not query:
+            return
         modtime = self.get_source_modtime()
         update_modified = modtime and datetime.datetime.fromtimestamp(modtime)
         if update:
             update_modified = update_modified or datetime.datetime.utcnow()
-        return models.Source.objects.get_file(
+        started = metrics.start()
+        source = models.Source.objects.get_file(
             create=create, update_modified=update_modified,
             storage=self.source_storage, name=self.name)
+        metrics.timing('query', started, model=models.Source)
+        memo['source'] = source
+        return source
+
+    def invalidate_source_cache(self):
+        """
+        Forget the source modification time and cached ``Source`` reference
+        memoized by this instance, for use once the source file has changed.
+
+        """
+        self._source_memo.clear()
 
-    def get_thumbnail_cache(self, thumbnail_name, create=False, update=False):
+    def get_source_modified(self, source):
+        """
+        Return the modification date of the source file, used to tell whether
+        it changed since it was found to be unreadable.
+
+        This is the file's modification time if the source storage is local,
+        otherwise the date cached on the ``source`` reference.
+
+        """
+        modtime = self.get_source_modtime()
+        if modtime:
+            modified = datetime.datetime.fromtimestamp(modtime)
+        else:
+            modified = source.modified
+        # Not all databases store microseconds.
+        return modified.replace(microsecond=0)
+
+    def source_unreadable(self):
+        """
+        Return whether the source couldn't be read as an image when it was
+        last tried, and hasn't been modified since.
+
+        """
+        source = self.get_source_cache()
+        if not source or not source.unreadable_modified:
+            return False
+        return (source.unreadable_modified.replace(microsecond=0) ==
+                self.get_source_modified(source))
+
+    def set_source_unreadable(self, unreadable):
+        """
+        Remember whether the source could be read as an image.
+
+        """
+        if unreadable:
+            source = self.get_source_cache(create=True)
+            modified = self.get_source_modified(source)
+        else:
+            source = self.get_source_cache()
+            if not source or not source.unreadable_modified:
+                return
+            modified = None
+        models.Source.objects.filter(pk=source.pk).update(
+            unreadable_modified=modified)
+        source.unreadable_modified = modified
+
+    def source_preview_wanted(self):
+        """
+        Return whether a preview of the source should be computed (i.e. the
+        ``THUMBNAIL_SOURCE_PREVIEWS`` setting is ``True`` and there isn't one
+        stored yet).
+
+        """
+        if not utils.get_setting('SOURCE_PREVIEWS'):
+            return False
+        source = self.get_source_cache()
+        return not source or not source.preview
+
+    def set_source_preview(self, preview, dominant_color):
+        """
+        Store the preview ``data:`` URI and dominant color of the source.
+
+        """
+        source = self.get_source_cache(create=True)
+        models.Source.objects.filter(pk=source.pk).update(
+            preview=preview, dominant_color=dominant_color)
+        source.preview = preview
+        source.dominant_color = dominant_color
+
+    def get_preview(self):
+        """
+        Return the stored preview of the source (a ``data:`` URI of a tiny
+        version of the source image), or an empty string if there isn't one.
+
+        """
+        source = self.get_source_cache()
+        return source and source.preview or ''
+
+    def get_dominant_color(self):
+        """
+        Return the stored dominant color of the source (as a ``#rrggbb``
+        string), or an empty string if there isn't one.
+
+        """
+        source = self.get_source_cache()
+        return source and source.dominant_color or ''
+
+    def get_source_metadata(self):
+        """
+        Return a dictionary of the source image's ``width``, ``height``,
+        ``format`` and ``mode``, or ``None`` if the source can't be read as an
+        image.
+
+        The metadata is read from the source's header (without decoding the
+        image) the first time, and stored on its cache reference until the
+        source is modified.
+
+        """
+        source = self.get_source_cache()
+        if source and source.width is not None:
+            return {'width': source.width, 'height': source.height,
+                    'format': source.format, 'mode': source.mode}
+        was_closed = self.closed
+        self.open()
+        try:
+            self.seek(0)
+            metadata = source_generators.read_metadata(self)
+        finally:
+            if was_closed:
+                self.close()
+        if metadata is None:
+            return
+        source = self.get_source_cache(create=True)
+        models.Source.objects.filter(pk=source.pk).update(**metadata)
+        for field, value in metadata.items():
+            setattr(source, field, value)
+        return metadata
+
+    def get_thumbnail_cache(self, thumbnail_name, create=False, update=False,
+                            options=None):
+        """
+        Return the cached ``Thumbnail`` reference for a thumbnail name.
+
+        If ``create`` is ``True`` and it doesn't exist yet, it is created
+        (recording the canonical thumbnail ``options`` string, if provided).
+
+        """
         modtime = self.get_thumbnail_modtime(thumbnail_name)
         update_modified = modtime and datetime.datetime.fromtimestamp(modtime)
         if update:
             update_modified = update_modified or datetime.datetime.utcnow()
         source = self.get_source_cache(create=True)
-        return models.Thumbnail.objects.get_file(
+        kwargs = {}
+        if options is not None:
+            kwargs['defaults'] = {'options': options}
+        started = metrics.start()
+        thumbnail = models.Thumbnail.objects.get_file(
             create=create, update_modified=update_modified,
-            storage=self.thumbnail_storage, source=source, name=thumbnail_name)
+            storage=self.thumbnail_storage, source=source, name=thumbnail_name,
+            **kwargs)
+        metrics.timing('query', started, model=models.Thumbnail)
+        return thumbnail
 
     def get_source_modtime(self):
-        try:
-            path = self.source_storage.path(self.name)
-            return os.path.getmtime(path)
-        except OSError:
-            return 0
-        except NotImplementedError:
-            return None
+        memo = self._source_memo
+        if 'modtime' not in memo:
+            try:
+                path = self.source_storage.path(self.name)
+                memo['modtime'] = os.path.getmtime(path)
+            except OSError:
+                memo['modtime'] = 0
+            except NotImplementedError:
+                memo['modtime'] = None
+        return memo['modtime']
 
     def get_thumbnail_modtime(self, thumbnail_name):
         try:
@@ -397,9 +806,22 @@ class Thumbnailer(File):
         except NotImplementedError:
             return None
 
+    def read_source(self):
+        """
+        Return the contents of the source file.
+
+        """
+        was_closed = self.closed
+        self.open()
+        try:
+            self.seek(0)
+            return self.read()
+        finally:
+            if was_closed:
+                self.close()
+
     def is_transparent(self, image):
-        return (image.mode == 'RGBA' or
-                (image.mode == 'P' and 'transparency' in image.info))
+        return utils.is_transparent(image)
 
 
 
@@ -423,6 +845,7 @@ class ThumbnailerFieldFile(FieldFile, Thumbnailer):
 
         """
         super(ThumbnailerFieldFile, self).save(name, content, *args, **kwargs)
+        self.invalidate_source_cache()
         self.get_source_cache(create=True, update=True)
 
     def delete(self, *args, **kwargs):
@@ -435,17 +858,19 @@ class ThumbnailerFieldFile(FieldFile, Thumbnailer):
         if source_cache:
             thumbnail_storage_hash = utils.get_storage_hash(
                                                     self.thumbnail_storage)
-            for thumbnail_cache in source_cache.thumbnails.all():
-                # Only attempt to delete the file if it was stored using the
-                # same storage as is currently used.
-                if thumbnail_cache.storage_hash == thumbnail_storage_hash:
-                    self.thumbnail_storage.delete(thumbnail_cache.name)
+            # Only attempt to delete the files which were stored using the
+            # same storage as is currently used.
+            delete_files(self.thumbnail_storage,
+                         source_cache.thumbnails.filter(
+                            storage_hash=thumbnail_storage_hash)
+                         .values_list('name', flat=True))
         # Next, delete the source image.
         super(ThumbnailerFieldFile, self).delete(*args, **kwargs)
         # Finally, delete the source cache entry (which will also delete any
         # thumbnail cache entries).
         if source_cache:
             source_cache.delete()
+        self.invalidate_source_cache()
 
     def get_thumbnails(self, *args, **kwargs):
         """
@@ -1,68 +1,277 @@
 from django.conf import settings
 from easy_thumbnails.utils import get_setting
+import cPickle as pickle
 import os
 import re
 
-re_thumbnail_file = re.compile(r'(?P<source_filename>.+)_(?P<x>\d+)x(?P<y>\d+)'
-                               r'(?:_(?P<options>\w+))?_q(?P<quality>\d+)'
-                               r'(?:.[^.]+)?$')
+re_thumbnail_file = re.compile(r'(?P<source_filename>.+)(?P<separator>[_.])'
+                               r'(?P<x>\d+)x(?P<y>\d+)'
+                               r'(?:_(?P<options>[-,\w]+?))?_q(?P<quality>\d+)'
+                               r'(?:_(?P<extra_options>[-,\w]+))?'
+                               r'(?:\.[^.]+)?$')
+re_shard_dir = re.compile(r'[0-9a-f]{2}$')
+# Hashed thumbnail names (see ``THUMBNAIL_HASHED_NAMES``) don't contain the
+# source name or options, so they are looked up in the thumbnail cache.
+re_hashed_thumbnail_file = re.compile(r'[0-9a-f]{32}\.[^.]+$')
+re_options = re.compile(r'(?P<x>\d+)x(?P<y>\d+)_q(?P<quality>\d+)'
+                        r'(?:_(?P<options>.+))?$')
 
 
-def all_thumbnails(path, recursive=True, prefix=None, subdir=None):
+class ThumbnailIndex(object):
+    """
+    An in-memory index of all files within a path which match the thumbnail
+    format, grouped by source image.
+
+    The index is built with a single walk of the directory tree, so it can be
+    shared by any number of :func:`thumbnails_for_file`,
+    :func:`delete_thumbnails` and :func:`delete_all_thumbnails` calls. It can
+    also be saved to disk (with :meth:`save`) and loaded again later (with
+    :meth:`load`), though it will not reflect any changes to the files made
+    in the mean time.
+
+    Thumbnails saved in shard directories (see ``THUMBNAIL_SHARD_DEPTH``) are
+    grouped with the source image of the directory containing the shards.
+
+    If ``hashed_names`` is ``True`` (defaulting to the
+    ``THUMBNAIL_HASHED_NAMES`` setting), thumbnails with hashed names are
+    grouped with their source image as recorded in the thumbnail cache (see
+    :meth:`add_hashed`), and those which aren't in the cache are listed in
+    ``unmatched``.
+
+    """
+
+    def __init__(self, path, recursive=True, prefix=None, subdir=None,
+                 shard_depth=None, hashed_names=None, root=None,
+                 storage_hashes=None):
+        if prefix is None:
+            prefix = get_setting('PREFIX')
+        if subdir is None:
+            subdir = get_setting('SUBDIR')
+        if shard_depth is None:
+            shard_depth = get_setting('SHARD_DEPTH')
+        if hashed_names is None:
+            hashed_names = get_setting('HASHED_NAMES')
+        if not path.endswith('/'):
+            path = '%s/' % path
+        self.path = path
+        self.thumbnails = {}
+        self.unmatched = []
+        self.build(recursive, prefix, subdir, shard_depth, hashed_names, root,
+                   storage_hashes)
+
+    def build(self, recursive, prefix, subdir, shard_depth=0,
+              hashed_names=False, root=None, storage_hashes=None):
+        len_path = len(self.path)
+        if recursive:
+            all = os.walk(self.path)
+        else:
+            files = []
+            for file in os.listdir(self.path):
+                if os.path.isfile(os.path.join(self.path, file)):
+                    files.append(file)
+            all = [(self.path, [], files)]
+        hashed = []
+        for dir_, subdirs, files in all:
+            rel_dir = dir_[len_path:]
+            if hashed_names:
+                for file in files:
+                    if is_hashed_thumbnail(file, prefix):
+                        hashed.append(os.path.join(dir_, file))
+            if shard_depth:
+                bits = rel_dir.split('/')
+                shards = bits[-shard_depth:]
+                invalid = [bit for bit in shards
+                           if not re_shard_dir.match(bit)]
+                if len(shards) == shard_depth and not invalid:
+                    rel_dir = '/'.join(bits[:-shard_depth])
+            if subdir and rel_dir.endswith(subdir):
+                rel_dir = rel_dir[:-len(subdir)]
+            for file in files:
+                thumb = re_thumbnail_file.match(file)
+                if not thumb:
+                    continue
+                d = thumb.groupdict()
+                source_filename = d.pop('source_filename')
+                if prefix:
+                    source_path, source_filename = os.path.split(
+                        source_filename)
+                    if not source_filename.startswith(prefix):
+                        continue
+                    source_filename = os.path.join(source_path,
+                        source_filename[len(prefix):])
+                options = []
+                for key in ('options', 'extra_options'):
+                    value = d.pop(key)
+                    if value:
+                        options.extend(value.split('_'))
+                d['options'] = options
+                # Thumbnails named in the older format replaced the dot
+                # before the source extension with an underscore. Corner-case
+                # bug: if the filename didn't have an extension but did have
+                # an underscore, the last underscore will get converted to a
+                # '.'.
+                if d.pop('separator') == '_':
+                    m = re.match(r'(.*)_(.*)', source_filename)
+                    if m:
+                        source_filename = '%s.%s' % m.groups()
+                filename = os.path.join(rel_dir, source_filename)
+                d['filename'] = os.path.join(dir_, file)
+                self.thumbnails.setdefault(filename, []).append(d)
+        if hashed:
+            self.add_hashed(hashed, root, storage_hashes)
+
+    def add_hashed(self, filenames, root=None, storage_hashes=None,
+                   chunk_size=500):
+        """
+        Add thumbnails with hashed names, given as a list of their full
+        filenames, using the thumbnail cache entries of the storages located
+        at ``root`` (which defaults to ``MEDIA_ROOT``).
+
+        The cache entries are looked up by the filenames relative to ``root``
+        and the ``storage_hashes`` of the storages (which default to those of
+        the known storages located at ``root``). Any file without a cache
+        entry is added to ``unmatched`` instead.
+
+        """
+        from easy_thumbnails.models import Thumbnail
+        if root is None:
+            root = settings.MEDIA_ROOT
+        if storage_hashes is None:
+            storage_hashes = _storage_hashes(root)
+        root = os.path.abspath(root)
+        candidates = {}
+        for filename in filenames:
+            name = os.path.relpath(os.path.abspath(filename), root)
+            if name.split(os.sep)[0] == os.pardir:
+                self.unmatched.append(filename)
+            else:
+                candidates[name] = filename
+        names = candidates.keys()
+        for i in range(0, len(names), chunk_size):
+            for name, source_name, options in Thumbnail.objects.filter(
+                    storage_hash__in=storage_hashes,
+                    name__in=names[i:i + chunk_size]).values_list(
+                    'name', 'source__name', 'options'):
+                filename = candidates.pop(name, None)
+                if filename is None:
+                    continue
+                d = parse_options(options)
+                if d is None:
+                    self.unmatched.append(filename)
+                    continue
+                d['filename'] = filename
+                self.thumbnails.setdefault(source_name, []).append(d)
+        self.unmatched.extend(candidates.values())
+
+    def thumbnails_for(self, relative_source_path):
+        """
+        Return the list of thumbnail dictionaries for a source image (see
+        :func:`thumbnails_for_file`).
+
+        """
+        return self.thumbnails.get(relative_source_path, [])
+
+    def remove(self, relative_source_path):
+        """
+        Remove a source image's thumbnails from the index, returning them.
+
+        """
+        return self.thumbnails.pop(relative_source_path, [])
+
+    def save(self, filename):
+        """
+        Save the index to a file.
+
+        """
+        f = open(filename, 'wb')
+        try:
+            pickle.dump((self.path, self.thumbnails, self.unmatched), f,
+                        pickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+
+    def load(cls, filename):
+        """
+        Load an index previously saved to a file.
+
+        """
+        f = open(filename, 'rb')
+        try:
+            data = pickle.load(f)
+        finally:
+            f.close()
+        # Indexes saved before hashed names were indexed have no unmatched
+        # list.
+        path, thumbnails, unmatched = (data + ([],))[:3]
+        index = cls.__new__(cls)
+        index.path = path
+        index.thumbnails = thumbnails
+        index.unmatched = unmatched
+        return index
+
+    load = classmethod(load)
+
+
+def is_hashed_thumbnail(filename, prefix=''):
+    """
+    Return whether a file name matches the format of hashed thumbnail names.
+
+    """
+    if prefix:
+        if not filename.startswith(prefix):
+            return False
+        filename = filename[len(prefix):]
+    return bool(re_hashed_thumbnail_file.match(filename))
+
+
+def _storage_hashes(root):
+    """
+    Return the list of storage hashes of the known storages (see
+    ``easy_thumbnails.storage.get_named_storages``) located at ``root``.
+
+    """
+    from easy_thumbnails.storage import get_named_storages
+    from easy_thumbnails.utils import get_storage_hash
+    root = os.path.abspath(root)
+    hashes = set()
+    for name, storage in get_named_storages():
+        location = getattr(storage, 'location', None)
+        if location and os.path.abspath(location) == root:
+            hashes.add(get_storage_hash(storage))
+    return list(hashes)
+
+
+def parse_options(options_string):
+    """
+    Return a thumbnail dictionary (without the ``filename``) from a canonical
+    thumbnail options string such as ``'100x100_q85_crop'``, or ``None`` if it
+    can't be parsed.
+
+    """
+    match = re_options.match(options_string or '')
+    if not match:
+        return
+    d = match.groupdict()
+    d['options'] = d['options'] and d['options'].split('_') or []
+    return d
+
+
+def all_thumbnails(path, recursive=True, prefix=None, subdir=None,
+                   shard_depth=None):
     """
     Return a dictionary referencing all files which match the thumbnail format.
 
     Each key is a source image filename, relative to path.
     Each value is a list of dictionaries as explained in `thumbnails_for_file`.
     """
-    if prefix is None:
-        prefix = get_setting('PREFIX')
-    if subdir is None:
-        subdir = get_setting('SUBDIR')
-    thumbnail_files = {}
-    if not path.endswith('/'):
-        path = '%s/' % path
-    len_path = len(path)
-    if recursive:
-        all = os.walk(path)
-    else:
-        files = []
-        for file in os.listdir(path):
-            if os.path.isfile(os.path.join(path, file)):
-                files.append(file)
-        all = [(path, [], files)]
-    for dir_, subdirs, files in all:
-        rel_dir = dir_[len_path:]
-        for file in files:
-            thumb = re_thumbnail_file.match(file)
-            if not thumb:
-                continue
-            d = thumb.groupdict()
-            source_filename = d.pop('source_filename')
-            if prefix:
-                source_path, source_filename = os.path.split(source_filename)
-                if not source_filename.startswith(prefix):
-                    continue
-                source_filename = os.path.join(source_path,
-                    source_filename[len(prefix):])
-            d['options'] = d['options'] and d['options'].split('_') or []
-            if subdir and rel_dir.endswith(subdir):
-                rel_dir = rel_dir[:-len(subdir)]
-            # Corner-case bug: if the filename didn't have an extension but did
-            # have an underscore, the last underscore will get converted to a
-            # '.'.
-            m = re.match(r'(.*)_(.*)', source_filename)
-            if m:
-                source_filename = '%s.%s' % m.groups()
-            filename = os.path.join(rel_dir, source_filename)
-            thumbnail_file = thumbnail_files.setdefault(filename, [])
-            d['filename'] = os.path.join(dir_, file)
-            thumbnail_file.append(d)
-    return thumbnail_files
+    return ThumbnailIndex(path, recursive=recursive, prefix=prefix,
+                          subdir=subdir, shard_depth=shard_depth).thumbnails
 
 
 def thumbnails_for_file(relative_source_path, root=None, basedir=None,
-                        subdir=None, prefix=None):
+                        subdir=None, prefix=None, index=None,
+                        shard_depth=None, hashed_names=None,
+                        storage_hashes=None):
     """
     Return a list of dictionaries, one for each thumbnail belonging to the
     source image.
@@ -73,7 +282,21 @@ def thumbnails_for_file(relative_source_path, root=None, basedir=None,
       `x` and `y` -- the size of the thumbnail
       `options`   -- list of options for this thumbnail
       `quality`   -- quality setting for this thumbnail
+
+    If a `ThumbnailIndex` of the thumbnail root (i.e. `root` joined with
+    `basedir`) is provided as `index`, it is used rather than listing the
+    source image's thumbnail directory.
+
+    With `shard_depth`, only the shard directories of the thumbnail options
+    recorded in the thumbnail cache for this source are listed (a
+    `ThumbnailIndex` finds every sharded thumbnail). If `hashed_names` is
+    true (defaulting to the ``THUMBNAIL_HASHED_NAMES`` setting), thumbnails
+    with hashed names are also found using the thumbnail cache entries of
+    `storage_hashes` (defaulting to those of the known storages located at
+    `root`).
     """
+    if index is not None:
+        return index.thumbnails_for(relative_source_path)
     if root is None:
         root = settings.MEDIA_ROOT
     if prefix is None:
@@ -82,22 +305,88 @@ def thumbnails_for_file(relative_source_path, root=None, basedir=None,
         subdir = get_setting('SUBDIR')
     if basedir is None:
         basedir = get_setting('BASEDIR')
+    if shard_depth is None:
+        shard_depth = get_setting('SHARD_DEPTH')
+    if hashed_names is None:
+        hashed_names = get_setting('HASHED_NAMES')
     source_dir, filename = os.path.split(relative_source_path)
     thumbs_path = os.path.join(root, basedir, source_dir, subdir)
     if not os.path.isdir(thumbs_path):
         return []
-    files = all_thumbnails(thumbs_path, recursive=False, prefix=prefix,
-                           subdir='')
-    return files.get(filename, [])
+    thumbs = ThumbnailIndex(thumbs_path, recursive=False, prefix=prefix,
+                            subdir='', shard_depth=0,
+                            hashed_names=False).thumbnails_for(filename)
+    if shard_depth:
+        for shard_path in _shard_paths(relative_source_path, shard_depth):
+            path = os.path.join(thumbs_path, shard_path)
+            if os.path.isdir(path):
+                thumbs.extend(ThumbnailIndex(path, recursive=False,
+                    prefix=prefix, subdir='', shard_depth=0,
+                    hashed_names=False).thumbnails_for(filename))
+    if hashed_names:
+        if storage_hashes is None:
+            storage_hashes = _storage_hashes(root)
+        thumbs.extend(_hashed_thumbnails(relative_source_path, root, prefix,
+                                         storage_hashes))
+    return thumbs
+
+
+def _hashed_thumbnails(relative_source_path, root, prefix, storage_hashes):
+    """
+    Return the thumbnail dictionaries of a source's thumbnails with hashed
+    names which exist within ``root``, using the thumbnail cache entries of
+    the ``storage_hashes``.
+
+    """
+    from easy_thumbnails.models import Thumbnail
+    thumbs = []
+    for name, options in Thumbnail.objects.filter(
+            storage_hash__in=storage_hashes,
+            source__name=relative_source_path).values_list('name', 'options'):
+        if not is_hashed_thumbnail(os.path.basename(name), prefix):
+            continue
+        filename = os.path.join(root, name)
+        d = parse_options(options)
+        if d is None or not os.path.isfile(filename):
+            continue
+        d['filename'] = filename
+        thumbs.append(d)
+    return thumbs
+
+
+def _shard_paths(relative_source_path, shard_depth):
+    """
+    Return the set of shard directory paths of a source's thumbnails, using
+    the options strings recorded in the thumbnail cache.
+
+    """
+    from easy_thumbnails.files import Thumbnailer
+    from easy_thumbnails.models import Thumbnail
+    thumbnailer = Thumbnailer(None, name=relative_source_path)
+    thumbnailer.thumbnail_shard_depth = shard_depth
+    options = Thumbnail.objects.filter(
+        source__name=relative_source_path).exclude(options='').values_list(
+        'options', flat=True).distinct()
+    return set([os.path.join(*thumbnailer.get_shard_dirs(options_string))
+                for options_string in options])
 
 
 def delete_thumbnails(relative_source_path, root=None, basedir=None,
-                      subdir=None, prefix=None):
+                      subdir=None, prefix=None, index=None, shard_depth=None,
+                      hashed_names=None, storage_hashes=None):
     """
     Delete all thumbnails for a source image.
+
+    If a `ThumbnailIndex` is provided as `index`, it is used to find the
+    thumbnails (and is updated to no longer contain them).
     """
-    thumbs = thumbnails_for_file(relative_source_path, root, basedir, subdir,
-                                 prefix)
+    if index is not None:
+        thumbs = index.remove(relative_source_path)
+    else:
+        thumbs = thumbnails_for_file(relative_source_path, root, basedir,
+                                     subdir, prefix, shard_depth=shard_depth,
+                                     hashed_names=hashed_names,
+                                     storage_hashes=storage_hashes)
     return _delete_using_thumbs_list(thumbs)
 
 
@@ -114,14 +403,26 @@ def _delete_using_thumbs_list(thumbs):
     return deleted
 
 
-def delete_all_thumbnails(path, recursive=True):
+def delete_all_thumbnails(path, recursive=True, index=None):
     """
     Delete all files within a path which match the thumbnails pattern.
 
     By default, matching files from all sub-directories are also removed. To
     only remove from the path directory, set recursive=False.
+
+    Files with hashed thumbnail names (if ``THUMBNAIL_HASHED_NAMES`` is set)
+    are removed too, whether or not they are in the thumbnail cache.
+
+    If a `ThumbnailIndex` of the path is provided as `index`, it is used
+    rather than walking the path again (and is emptied).
     """
+    if index is None:
+        index = ThumbnailIndex(path, recursive=recursive)
     total = 0
-    for thumbs in all_thumbnails(path, recursive=recursive).values():
+    for thumbs in index.thumbnails.values():
         total += _delete_using_thumbs_list(thumbs)
-    return total
\ No newline at end of file
+    total += _delete_using_thumbs_list(
+        [{'filename': filename} for filename in index.unmatched])
+    index.thumbnails = {}
+    index.unmatched = []
+    return total
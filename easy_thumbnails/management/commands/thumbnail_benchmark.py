@@ -0,0 +1,59 @@
+from django.core.management.base import CommandError, NoArgsCommand
+from django.utils import simplejson
+from easy_thumbnails import benchmark
+from optparse import make_option
+
+
+class Command(NoArgsCommand):
+    help = ("Benchmarks the thumbnail pipeline using generated images, "
+            "outputting the results as JSON.")
+    option_list = NoArgsCommand.option_list + (
+        make_option('--iterations', type='int', dest='iterations',
+            default=10, help="Number of times to run each benchmark."),
+        make_option('--fixtures', dest='fixtures', default=None,
+            help="Comma separated names of the fixture images to use (%s)." %
+                 ', '.join([fixture[0] for fixture in benchmark.FIXTURES])),
+        make_option('--match', dest='match', default=None,
+            help="Only run the benchmarks whose name contains this text."),
+        make_option('--no-isolate', action='store_false', dest='isolate',
+            default=True, help="Run the benchmarks in this process (peak "
+            "memory is then only reported as it grows)."),
+        make_option('--output', dest='output', default=None,
+            help="File to write the JSON results to rather than stdout."),
+        make_option('--compare', dest='compare', default=None,
+            help="JSON results of a previous run to compare the median "
+            "times with (written to stderr)."),
+    )
+
+    def handle_noargs(self, **options):
+        previous = None
+        if options['compare']:
+            try:
+                previous = simplejson.load(open(options['compare']))
+            except (IOError, ValueError), e:
+                raise CommandError("Couldn't read results to compare with: "
+                                   "%s" % e)
+        fixtures = options['fixtures']
+        if fixtures:
+            fixtures = fixtures.split(',')
+        results = benchmark.run(iterations=options['iterations'],
+                                fixtures=fixtures, match=options['match'],
+                                isolate=options['isolate'])
+        output = simplejson.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            f = open(options['output'], 'w')
+            try:
+                f.write(output)
+            finally:
+                f.close()
+        else:
+            self.stdout.write(output + '\n')
+        if previous:
+            for name, before, after, ratio in benchmark.compare(previous,
+                                                                results):
+                if ratio is None:
+                    change = 'n/a'
+                else:
+                    change = '%+.1f%%' % ((ratio - 1) * 100)
+                self.stderr.write('%-50s %10.2fms %10.2fms %8s\n' %
+                                  (name, before * 1000, after * 1000, change))
@@ -1,75 +1,103 @@
-import os
-import re
-from django.db import models
-from django.conf import settings
 from django.core.management.base import NoArgsCommand
-from easy_thumbnails.utils import get_setting
+from easy_thumbnails import models
+from easy_thumbnails.storage import delete_files, get_storages
+from multiprocessing.pool import ThreadPool
+from optparse import make_option
 
 
-try:
-    set
-except NameError:
-    from sets import Set as set     # For Python 2.3
+def clean_up(dry_run=False, chunk_size=500, threads=10, storages=None):
+    """
+    Delete the thumbnails (and cached references) of source files which no
+    longer exist.
 
-thumb_re = re.compile(r'^%s(.*)_\d{1,}x\d{1,}_[-\w]*q([1-9]\d?|100)\.jpg' %
-                      get_setting('PREFIX'))
+    Sources are read from the ``Source`` table in chunks of ``chunk_size``
+    rows, using a pool of ``threads`` threads to check whether the files
+    exist (and to delete them), so any storage is supported (sources and
+    thumbnails using an unknown storage, or a storage hash shared by
+    differently configured storages, are left alone). Thumbnails are deleted
+    with :func:`~easy_thumbnails.storage.delete_files`, and only the
+    references of the thumbnail files which were deleted are removed. A
+    missing source's reference is removed once it has no thumbnail references
+    left.
 
+    Returns a dictionary containing the number of ``sources`` checked, the
+    number of ``missing`` sources and the number of ``thumbnails`` deleted.
 
-def get_thumbnail_path(path):
-    basedir = get_setting('BASEDIR')
-    subdir = get_setting('SUBDIR')
-    return os.path.join(basedir, path, subdir)
+    """
+    if storages is None:
+        storages = get_storages()
+    pool = ThreadPool(threads)
+    stats = {'sources': 0, 'missing': 0, 'thumbnails': 0}
+    last_pk = 0
+    try:
+        while True:
+            sources = list(models.Source.objects.filter(pk__gt=last_pk)
+                           .order_by('pk')[:chunk_size])
+            if not sources:
+                break
+            last_pk = sources[-1].pk
+            stats['sources'] += len(sources)
+            missing = [source.pk for source, exists in
+                       zip(sources, pool.map(_exists_or_unknown,
+                            [(storages, source) for source in sources]))
+                       if not exists]
+            if not missing:
+                continue
+            stats['missing'] += len(missing)
+            thumbnails = {}
+            for pk, storage_hash, name in models.Thumbnail.objects.filter(
+                    source__in=missing).values_list('pk', 'storage_hash',
+                                                    'name'):
+                if storage_hash in storages:
+                    thumbnails.setdefault(storage_hash, []).append((pk, name))
+            if dry_run:
+                stats['thumbnails'] += sum([len(files) for files in
+                                            thumbnails.values()])
+                continue
+            for storage_hash, files in thumbnails.items():
+                deleted = set(delete_files(storages[storage_hash],
+                                           [name for pk, name in files],
+                                           pool=pool))
+                deleted_pks = [pk for pk, name in files if name in deleted]
+                models.Thumbnail.objects.filter(pk__in=deleted_pks).delete()
+                stats['thumbnails'] += len(deleted_pks)
+            # Sources which still have thumbnails (using an unknown storage,
+            # or which couldn't be deleted) are kept to track them.
+            models.Source.objects.filter(pk__in=missing,
+                                         thumbnails__isnull=True).delete()
+    finally:
+        pool.close()
+        pool.join()
+    return stats
 
 
-def clean_up():
-    paths = set()
-    for app in models.get_apps():
-        model_list = models.get_models(app)
-        for model in model_list:
-            for field in model._meta.fields:
-                if isinstance(field, models.ImageField):
-                    #TODO: take care of date formatted and callable upload_to.
-                    if (not callable(field.upload_to) and
-                            field.upload_to.find("%") == -1):
-                        paths = paths.union((field.upload_to,))
-    paths = list(paths)
-    for path in paths:
-        thumbnail_path = get_thumbnail_path(path)
-        try:
-            file_list = os.listdir(os.path.join(settings.MEDIA_ROOT,
-                                                thumbnail_path))
-        except OSError:
-            continue # Dir doesn't exists, no thumbnails here.
-        for fn in file_list:
-            m = thumb_re.match(fn)
-            if m:
-                # Due to that the naming of thumbnails replaces the dot before
-                # extension with an underscore we have 2 possibilities for the
-                # original filename. If either present we do not delete
-                # suspected thumbnail.
-                # org_fn is the expected original filename w/o extension
-                # org_fn_alt is the expected original filename with extension
-                org_fn = m.group(1)
-                org_fn_exists = os.path.isfile(
-                            os.path.join(settings.MEDIA_ROOT, path, org_fn))
-
-                usc_pos = org_fn.rfind("_")
-                if usc_pos != -1:
-                    org_fn_alt = "%s.%s" % (org_fn[0:usc_pos],
-                                            org_fn[usc_pos+1:])
-                    org_fn_alt_exists = os.path.isfile(
-                        os.path.join(settings.MEDIA_ROOT, path, org_fn_alt))
-                else:
-                    org_fn_alt_exists = False
-                if not org_fn_exists and not org_fn_alt_exists:
-                    del_me = os.path.join(settings.MEDIA_ROOT,
-                                          thumbnail_path, fn)
-                    os.remove(del_me)
+def _exists_or_unknown(args):
+    storages, source = args
+    storage = storages.get(source.storage_hash)
+    return storage is None or storage.exists(source.name)
 
 
 class Command(NoArgsCommand):
     help = "Deletes thumbnails that no longer have an original file."
     requires_model_validation = False
+    option_list = NoArgsCommand.option_list + (
+        make_option('--dry-run', action='store_true', dest='dry_run',
+            default=False, help="Only report what would be deleted."),
+        make_option('--chunk-size', type='int', dest='chunk_size',
+            default=500, help="Number of sources to check at a time."),
+        make_option('--threads', type='int', dest='threads', default=10,
+            help="Number of concurrent storage requests."),
+    )
 
     def handle_noargs(self, **options):
-        clean_up()
+        stats = clean_up(dry_run=options['dry_run'],
+                         chunk_size=options['chunk_size'],
+                         threads=options['threads'])
+        if int(options.get('verbosity', 1)):
+            if options['dry_run']:
+                message = ("%(sources)s sources checked, %(missing)s missing, "
+                           "%(thumbnails)s thumbnails would be deleted.\n")
+            else:
+                message = ("%(sources)s sources checked, %(missing)s missing, "
+                           "%(thumbnails)s thumbnails deleted.\n")
+            self.stdout.write(message % stats)
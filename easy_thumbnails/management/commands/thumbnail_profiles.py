@@ -0,0 +1,44 @@
+from django.core.management.base import NoArgsCommand
+from easy_thumbnails import profiling
+from optparse import make_option
+import pstats
+
+
+class Command(NoArgsCommand):
+    help = ("Summarizes the profiles dumped for slow thumbnails (see the "
+            "THUMBNAIL_PROFILE_THRESHOLD setting).")
+    requires_model_validation = False
+    option_list = NoArgsCommand.option_list + (
+        make_option('--dir', dest='directory', default=None,
+            help="Directory containing the profiles (defaults to the "
+            "THUMBNAIL_PROFILE_DIR setting)."),
+        make_option('--limit', type='int', dest='limit', default=10,
+            help="Number of the slowest profiles to summarize."),
+        make_option('--functions', type='int', dest='functions', default=20,
+            help="Number of functions to list from the combined profiles."),
+        make_option('--sort', dest='sort', default='cumulative',
+            help="How to sort the functions (see pstats.Stats.sort_stats)."),
+    )
+
+    def handle_noargs(self, **options):
+        dumps = profiling.get_dumps(options['directory'])
+        if not dumps:
+            self.stdout.write("No profiles found.\n")
+            return
+        self.stdout.write("%s profiles found, the slowest:\n\n" % len(dumps))
+        dumps = dumps[:options['limit']]
+        for metadata, path in dumps:
+            size = metadata.get('size')
+            if size:
+                size = '%sx%s' % tuple(size)
+            self.stdout.write(
+                "%.2fs  %s  (%s %s %s)  %s\n" % (
+                    metadata.get('time', 0), metadata.get('source') or '?',
+                    size or '?', metadata.get('mode') or '?',
+                    metadata.get('format') or '?', metadata.get('options')))
+        self.stdout.write("\n")
+        stats = pstats.Stats(dumps[0][1], stream=self.stdout)
+        for metadata, path in dumps[1:]:
+            stats.add(path)
+        stats.strip_dirs().sort_stats(options['sort'])
+        stats.print_stats(options['functions'])
@@ -0,0 +1,93 @@
+"""
+Optional instrumentation of the thumbnail pipeline.
+
+Each stage of generating and storing a thumbnail is timed when something is
+listening: either a receiver connected to one of the
+:mod:`easy_thumbnails.signals` or a metrics client set with the
+``THUMBNAIL_METRICS`` setting. Otherwise the instrumented code skips the
+timing altogether.
+
+"""
+from easy_thumbnails import signals, utils
+from timeit import default_timer
+
+_client = (None, None)
+
+
+def get_client():
+    """
+    Return the metrics client set by the ``THUMBNAIL_METRICS`` setting, or
+    ``None`` if there isn't one.
+
+    """
+    global _client
+    path = utils.get_setting('METRICS')
+    if not path:
+        return None
+    if _client[0] != path:
+        _client = (path, utils.dynamic_import(path))
+    return _client[1]
+
+
+def is_enabled():
+    """
+    Return whether the pipeline stages should be timed.
+
+    """
+    return bool(signals.stage_timed.receivers or get_client())
+
+
+def start():
+    """
+    Return the starting time to pass to ``timing`` (or ``None`` if
+    instrumentation isn't enabled).
+
+    """
+    if is_enabled():
+        return default_timer()
+
+
+def timing(stage, started, processor=None, model=None):
+    """
+    Record the time taken by a pipeline stage since ``started`` (the value
+    returned by ``start``), doing nothing if ``started`` is ``None``.
+
+    Returns the time once the stage was recorded, which can be used as the
+    starting time of a following stage.
+
+    """
+    if started is None:
+        return
+    duration = default_timer() - started
+    client = get_client()
+    if client:
+        stat = stage
+        if processor is not None:
+            # Processors can be partials or callable instances too.
+            stat = '%s.%s' % (stat, getattr(processor, '__name__',
+                                            processor.__class__.__name__))
+        elif model is not None:
+            stat = '%s.%s' % (stat, model.__name__.lower())
+        client.timing(get_stat_name(stat), int(duration * 1000))
+    signals.stage_timed.send(sender=None, stage=stage, duration=duration,
+                             processor=processor, model=model)
+    return default_timer()
+
+
+def existence_checked(name, exists):
+    """
+    Count a check for an existing thumbnail as a cache hit or miss.
+
+    """
+    client = get_client()
+    if client:
+        client.incr(get_stat_name(exists and 'exists.hit' or 'exists.miss'))
+    signals.existence_checked.send(sender=None, name=name,
+                                   exists=bool(exists))
+
+
+def get_stat_name(stat):
+    prefix = utils.get_setting('METRICS_PREFIX')
+    if prefix:
+        return '%s.%s' % (prefix, stat)
+    return stat
@@ -0,0 +1,60 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import DataMigration
+from django.db import models
+from django.db.models import Count, Min
+
+class Migration(DataMigration):
+    """
+    Remove duplicate source and thumbnail cache entries (which could be
+    created by concurrent requests) so that unique constraints can be added.
+
+    """
+
+    def forwards(self, orm):
+        "Write your forwards methods here."
+        duplicates = orm.Source.objects.values('storage_hash', 'name')\
+            .annotate(count=Count('id'), keep=Min('id')).filter(count__gt=1)
+        for duplicate in duplicates:
+            extra = list(orm.Source.objects.filter(
+                storage_hash=duplicate['storage_hash'],
+                name=duplicate['name']).exclude(pk=duplicate['keep'])
+                .values_list('pk', flat=True))
+            # Move the thumbnails over to the source which is being kept.
+            orm.Thumbnail.objects.filter(source__in=extra).update(
+                source=duplicate['keep'])
+            orm.Source.objects.filter(pk__in=extra).delete()
+        duplicates = orm.Thumbnail.objects\
+            .values('storage_hash', 'name', 'source')\
+            .annotate(count=Count('id'), keep=Min('id')).filter(count__gt=1)
+        for duplicate in duplicates:
+            orm.Thumbnail.objects.filter(
+                storage_hash=duplicate['storage_hash'],
+                name=duplicate['name'], source=duplicate['source'])\
+                .exclude(pk=duplicate['keep']).delete()
+
+    def backwards(self, orm):
+        "Write your backwards methods here."
+
+
+    models = {
+        'easy_thumbnails.source': {
+            'Meta': {'object_name': 'Source'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'modified': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime(2010, 10, 18, 9, 12, 4, 381520)'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'storage_hash': ('django.db.models.fields.CharField', [], {'max_length': '40', 'db_index': 'True'})
+        },
+        'easy_thumbnails.thumbnail': {
+            'Meta': {'object_name': 'Thumbnail'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'modified': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime(2010, 10, 18, 9, 12, 4, 381520)'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'options': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'source': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'thumbnails'", 'to': "orm['easy_thumbnails.Source']"}),
+            'storage_hash': ('django.db.models.fields.CharField', [], {'max_length': '40', 'db_index': 'True'})
+        }
+    }
+
+    complete_apps = ['easy_thumbnails']
@@ -0,0 +1,94 @@
+# encoding: utf-8
+import datetime
+import warnings
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models, DatabaseError
+
+
+def create_unique(table, columns):
+    """
+    Add a unique constraint, returning whether it was added.
+
+    MySQL can't add these keys when they are longer than InnoDB allows (with
+    the ``utf8`` character set, unless large index prefixes are enabled), so
+    there the single column indexes are kept instead, with a warning.
+
+    """
+    if getattr(db, 'backend_name', None) != 'mysql':
+        db.create_unique(table, columns)
+        return True
+    try:
+        db.create_unique(table, columns)
+    except DatabaseError, e:
+        warnings.warn("Couldn't add the unique key on %s (%s) of %s, so its "
+                      "existing indexes are kept: %s" %
+                      (', '.join(columns), table, table, e))
+        return False
+    return True
+
+
+def delete_unique(table, columns):
+    """
+    Remove a unique constraint, returning whether there was one (it may not
+    have been added on MySQL, see ``create_unique``).
+
+    """
+    if getattr(db, 'backend_name', None) != 'mysql':
+        db.delete_unique(table, columns)
+        return True
+    try:
+        db.delete_unique(table, columns)
+    except (ValueError, DatabaseError):
+        return False
+    return True
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Adding unique constraint on 'Source', fields ['storage_hash', 'name']
+        if create_unique('easy_thumbnails_source', ['storage_hash', 'name']):
+            # Removing index on 'Source', fields ['storage_hash'] (covered by the unique constraint)
+            db.delete_index('easy_thumbnails_source', ['storage_hash'])
+
+        # Adding unique constraint on 'Thumbnail', fields ['storage_hash', 'name', 'source']
+        if create_unique('easy_thumbnails_thumbnail', ['storage_hash', 'name', 'source_id']):
+            # Removing index on 'Thumbnail', fields ['storage_hash'] (covered by the unique constraint)
+            db.delete_index('easy_thumbnails_thumbnail', ['storage_hash'])
+
+
+    def backwards(self, orm):
+        
+        # Removing unique constraint on 'Thumbnail', fields ['storage_hash', 'name', 'source']
+        if delete_unique('easy_thumbnails_thumbnail', ['storage_hash', 'name', 'source_id']):
+            # Adding index on 'Thumbnail', fields ['storage_hash']
+            db.create_index('easy_thumbnails_thumbnail', ['storage_hash'])
+
+        # Removing unique constraint on 'Source', fields ['storage_hash', 'name']
+        if delete_unique('easy_thumbnails_source', ['storage_hash', 'name']):
+            # Adding index on 'Source', fields ['storage_hash']
+            db.create_index('easy_thumbnails_source', ['storage_hash'])
+
+
+    models = {
+        'easy_thumbnails.source': {
+            'Meta': {'unique_together': "(('storage_hash', 'name'),)", 'object_name': 'Source'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'modified': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime(2010, 10, 18, 9, 12, 4, 381520)'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'storage_hash': ('django.db.models.fields.CharField', [], {'max_length': '40'})
+        },
+        'easy_thumbnails.thumbnail': {
+            'Meta': {'unique_together': "(('storage_hash', 'name', 'source'),)", 'object_name': 'Thumbnail'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'modified': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime(2010, 10, 18, 9, 12, 4, 381520)'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'options': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'source': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'thumbnails'", 'to': "orm['easy_thumbnails.Source']"}),
+            'storage_hash': ('django.db.models.fields.CharField', [], {'max_length': '40'})
+        }
+    }
+
+    complete_apps = ['easy_thumbnails']
@@ -0,0 +1,49 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Adding field 'Source.preview'
+        db.add_column('easy_thumbnails_source', 'preview', self.gf('django.db.models.fields.TextField')(default='', blank=True), keep_default=False)
+
+        # Adding field 'Source.dominant_color'
+        db.add_column('easy_thumbnails_source', 'dominant_color', self.gf('django.db.models.fields.CharField')(default='', max_length=7, blank=True), keep_default=False)
+
+
+    def backwards(self, orm):
+        
+        # Deleting field 'Source.preview'
+        db.delete_column('easy_thumbnails_source', 'preview')
+
+        # Deleting field 'Source.dominant_color'
+        db.delete_column('easy_thumbnails_source', 'dominant_color')
+
+
+    models = {
+        'easy_thumbnails.source': {
+            'Meta': {'unique_together': "(('storage_hash', 'name'),)", 'object_name': 'Source'},
+            'dominant_color': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '7', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'modified': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime(2010, 10, 18, 9, 12, 4, 381520)'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'preview': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'storage_hash': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'unreadable_modified': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'easy_thumbnails.thumbnail': {
+            'Meta': {'unique_together': "(('storage_hash', 'name', 'source'),)", 'object_name': 'Thumbnail'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'modified': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime(2010, 10, 18, 9, 12, 4, 381520)'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'options': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'source': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'thumbnails'", 'to': "orm['easy_thumbnails.Source']"}),
+            'storage_hash': ('django.db.models.fields.CharField', [], {'max_length': '40'})
+        }
+    }
+
+    complete_apps = ['easy_thumbnails']
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
 from easy_thumbnails import utils
 import datetime
 
@@ -9,31 +9,90 @@ class FileManager(models.Manager):
                  **kwargs):
         kwargs.update(dict(storage_hash=utils.get_storage_hash(storage),
                            name=name))
-        if create:
-            if update_modified:
-                defaults = kwargs.setdefault('defaults', {})
-                defaults['modified'] = update_modified
-            object, created = self.get_or_create(**kwargs)
-        else:
-            kwargs.pop('defaults', None)
+        defaults = kwargs.pop('defaults', {})
+        object = None
+        if create and update_modified and self.has_unique_keys():
+            # A modification date is usually being recorded for a file which
+            # was just saved, so try inserting the row straight away. The
+            # unique constraint on the lookup fields makes this fail if the
+            # row already exists, in which case it is updated instead.
+            params = dict(defaults, modified=update_modified)
+            params.update(kwargs)
+            object = self.model(**params)
+            sid = transaction.savepoint(using=self.db)
+            try:
+                object.save(force_insert=True, using=self.db)
+            except IntegrityError:
+                transaction.savepoint_rollback(sid, using=self.db)
+                object = None
+            else:
+                transaction.savepoint_commit(sid, using=self.db)
+                return object
+        elif create:
+            # The unique constraint on the lookup fields means that if another
+            # process creates the same file concurrently, get_or_create gets
+            # an IntegrityError and returns the other process's row.
+            try:
+                object, created = self.get_or_create(defaults=defaults,
+                                                     **kwargs)
+            except self.model.MultipleObjectsReturned:
+                object = self._get_duplicate(kwargs)
+            if not update_modified:
+                return object
+        if object is None:
             try:
                 object = self.get(**kwargs)
             except self.model.DoesNotExist:
                 return
-            created = False
-        if update_modified and object and not created:
-            if object.modified != update_modified:
-                self.filter(pk=object.pk).update(modified=update_modified)
+            except self.model.MultipleObjectsReturned:
+                object = self._get_duplicate(kwargs)
+        if update_modified and object.modified != update_modified:
+            changes = {'modified': update_modified}
+            # Not all databases store microseconds.
+            if (object.modified.replace(microsecond=0) !=
+                    update_modified.replace(microsecond=0)):
+                # The file has changed, so anything derived from its contents
+                # is out of date.
+                changes.update(self.model.derived_defaults)
+            self.filter(pk=object.pk).update(**changes)
+            for field, value in changes.items():
+                setattr(object, field, value)
         return object
 
+    def has_unique_keys(self):
+        """
+        Return whether the database is known to have the unique keys over
+        the lookup fields.
+
+        Migration 0015 can't add them on MySQL if they are longer than InnoDB
+        allows (keeping the single column indexes instead), so rows are never
+        inserted without looking for them first there.
+
+        """
+        engine = connections[self.db].settings_dict['ENGINE']
+        return not engine.endswith('mysql')
+
+    def _get_duplicate(self, lookups):
+        """
+        Return the most recent of several rows for the same file (only
+        possible without the unique keys, see ``has_unique_keys``).
+
+        """
+        return self.filter(**lookups).order_by('-pk')[0]
+
 
 class File(models.Model):
-    storage_hash = models.CharField(max_length=40, db_index=True)
+    # Not indexed on its own, since it leads the unique constraints.
+    storage_hash = models.CharField(max_length=40)
     name = models.CharField(max_length=255, db_index=True)
     modified = models.DateTimeField(default=datetime.datetime.utcnow())
 
     objects = FileManager()
 
+    # The values of any fields derived from the file's contents, which are
+    # reset when the file is modified.
+    derived_defaults = {}
+
     class Meta:
         abstract = True
 
@@ -42,8 +101,30 @@ class File(models.Model):
 
 
 class Source(File):
-    pass
+    # The modification date of the source file when it couldn't be read as an
+    # image, so it isn't tried again until the file changes.
+    unreadable_modified = models.DateTimeField(null=True, blank=True)
+    # A tiny preview of the source image (as a data URI) and its dominant
+    # color (as #rrggbb), see the THUMBNAIL_SOURCE_PREVIEWS setting.
+    preview = models.TextField(blank=True, default='')
+    dominant_color = models.CharField(max_length=7, blank=True, default='')
+    # The image metadata read from the source's header, see
+    # Thumbnailer.get_source_metadata.
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    format = models.CharField(max_length=10, blank=True, default='')
+    mode = models.CharField(max_length=10, blank=True, default='')
+
+    derived_defaults = {'preview': '', 'dominant_color': '', 'width': None,
+                        'height': None, 'format': '', 'mode': ''}
+
+    class Meta:
+        unique_together = (('storage_hash', 'name'),)
 
 
 class Thumbnail(File):
     source = models.ForeignKey(Source, related_name='thumbnails')
+    options = models.TextField(blank=True, default='')
+
+    class Meta:
+        unique_together = (('storage_hash', 'name', 'source'),)
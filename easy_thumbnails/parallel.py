@@ -0,0 +1,169 @@
+from django.db import connections, transaction
+from easy_thumbnails import placeholders, utils
+from easy_thumbnails.files import get_thumbnailer
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+import threading
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_thread_pool():
+    """
+    Return the pool of threads used to get thumbnails concurrently, starting
+    it if necessary.
+
+    The number of threads is set by the ``THUMBNAIL_THREADS`` setting.
+
+    """
+    global _pool
+    if _pool is None:
+        # Threads of a multithreaded server could otherwise start a pool each.
+        _pool_lock.acquire()
+        try:
+            if _pool is None:
+                _pool = ThreadPool(utils.get_setting('THREADS'))
+        finally:
+            _pool_lock.release()
+    return _pool
+
+
+def close_thread_pool():
+    """
+    Stop the thread pool (it will be started again if it is needed).
+
+    """
+    global _pool
+    _pool_lock.acquire()
+    try:
+        if _pool is not None:
+            _pool.close()
+            _pool.join()
+            _pool = None
+    finally:
+        _pool_lock.release()
+
+
+def close_connections():
+    """
+    Commit and close this thread's database connections.
+
+    The pool's threads are long lived, so without this each would hold a
+    connection open (idle in a transaction) between tasks.
+
+    """
+    for connection in connections.all():
+        transaction.commit_unless_managed(using=connection.alias)
+        connection.close()
+
+
+def _get_thumbnail(source, thumbnail_options, save=True):
+    try:
+        return get_thumbnailer(source).get_thumbnail(thumbnail_options,
+                                                     save=save)
+    finally:
+        close_connections()
+
+
+def _generate_thumbnail(source, thumbnail_options):
+    try:
+        return get_thumbnailer(source).generate_thumbnail(thumbnail_options)
+    finally:
+        close_connections()
+
+
+def get_thumbnail_async(source, thumbnail_options, save=True):
+    """
+    Start getting a thumbnail (see ``Thumbnailer.get_thumbnail``) in a
+    separate thread, so that the storage existence checks, reads and writes
+    don't block the caller.
+
+    ``source`` can be anything accepted by ``get_thumbnailer``. Returns a
+    result object; call its ``get()`` method to wait for the
+    ``ThumbnailFile``.
+
+    """
+    return get_thread_pool().apply_async(_get_thumbnail,
+                                         (source, thumbnail_options, save))
+
+
+def generate_thumbnail_async(source, thumbnail_options):
+    """
+    Start generating a thumbnail (see ``Thumbnailer.generate_thumbnail``) in
+    a separate thread, returning a result object like
+    :func:`get_thumbnail_async`.
+
+    If the ``THUMBNAIL_WORKER_PROCESSES`` setting is used, the image
+    processing itself will be done in the worker pool.
+
+    """
+    return get_thread_pool().apply_async(_generate_thumbnail,
+                                         (source, thumbnail_options))
+
+
+def get_thumbnail_url(source, thumbnail_options, timeout=0, save=True):
+    """
+    Return the URL of a thumbnail if it can be got (see
+    :func:`get_thumbnail_async`) within ``timeout`` seconds, otherwise the
+    URL of its placeholder (see the ``THUMBNAIL_PLACEHOLDER`` setting), while
+    the thumbnail carries on being got in the thread pool.
+
+    The placeholder is also used if getting the thumbnail fails. It is got
+    using a separate source file (opened from the source's storage), so it
+    doesn't read from the same file object as the thread getting the
+    thumbnail.
+
+    """
+    thumbnailer = get_thumbnailer(source)
+    result = get_thumbnail_async(thumbnailer, thumbnail_options, save=save)
+    try:
+        return result.get(timeout).url
+    except TimeoutError:
+        pass
+    except Exception:
+        if utils.get_setting('DEBUG'):
+            raise
+    try:
+        placeholder_source = get_thumbnailer(thumbnailer.source_storage,
+                                             thumbnailer.name)
+    except Exception:
+        if utils.get_setting('DEBUG'):
+            raise
+        placeholder_source = None
+    try:
+        return placeholders.get_placeholder_url(placeholder_source,
+                                                thumbnail_options)
+    finally:
+        if placeholder_source is not None:
+            placeholder_source.close()
+
+
+def gather(requests, save=True, timeout=None, fail_silently=False):
+    """
+    Get many thumbnails concurrently.
+
+    ``requests`` is a list of ``(source, thumbnail_options)`` tuples. Returns
+    a list of the ``ThumbnailFile`` instances, in the same order. Since file
+    objects can't safely be read from by multiple threads, use a separate
+    source file object for each request.
+
+    If getting any thumbnail fails, the exception is raised (after all the
+    thumbnails have been attempted) unless ``fail_silently`` is ``True``, in
+    which case ``None`` is used for that thumbnail instead.
+
+    """
+    results = [get_thumbnail_async(source, thumbnail_options, save=save)
+               for source, thumbnail_options in requests]
+    thumbnails = []
+    error = None
+    for result in results:
+        try:
+            thumbnails.append(result.get(timeout))
+        except Exception, e:
+            if error is None:
+                error = e
+            thumbnails.append(None)
+    if error is not None and not fail_silently:
+        raise error
+    return thumbnails
@@ -0,0 +1,248 @@
+"""
+Placeholders for thumbnails which couldn't be got (or aren't ready yet).
+
+The ``THUMBNAIL_PLACEHOLDER`` setting chooses the strategy: ``'static'`` (the
+``THUMBNAIL_PLACEHOLDER_URL`` setting), ``'lqip'`` (a tiny, smoothed preview
+of the source image as a ``data:`` URI) or ``'color'`` (a single pixel image
+of the source's dominant color as a ``data:`` URI). It can also be the full
+path to a function which receives the thumbnailer (or ``None`` if the source
+isn't known) and the thumbnail options and returns the placeholder's URL.
+
+The previews and colors stored on the source's cache reference (see the
+``THUMBNAIL_SOURCE_PREVIEWS`` setting) are used if there are any, otherwise
+they are computed from a decode of the source (subject to the
+``THUMBNAIL_OVERSIZE_POLICY`` setting, like a thumbnail's source) and cached
+per source (using Django's cache). Sources which can't be read as an image get
+no placeholder.
+
+"""
+from django.core.cache import cache
+from django.utils.hashcompat import md5_constructor
+from django.utils.encoding import smart_str
+from easy_thumbnails import engine, utils
+try:
+    from PIL import Image, ImageFilter
+except ImportError:
+    import Image
+    import ImageFilter
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+import base64
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The maximum width and height of a low quality image placeholder.
+LQIP_SIZE = 16
+
+
+def get_placeholder_url(thumbnailer=None, thumbnail_options=None):
+    """
+    Return the URL of the placeholder chosen by the ``THUMBNAIL_PLACEHOLDER``
+    setting (an empty string if there is no placeholder).
+
+    Errors are ignored (returning an empty string) unless the
+    ``THUMBNAIL_DEBUG`` setting is ``True``.
+
+    """
+    strategy = utils.get_setting('PLACEHOLDER')
+    if not strategy:
+        return ''
+    try:
+        function = PLACEHOLDERS.get(strategy)
+        if function is None:
+            function = utils.dynamic_import(strategy)
+        return function(thumbnailer, thumbnail_options) or ''
+    except Exception:
+        if utils.get_setting('DEBUG'):
+            raise
+        return ''
+
+
+def static_placeholder(thumbnailer, thumbnail_options):
+    """
+    Return the ``THUMBNAIL_PLACEHOLDER_URL`` setting.
+
+    """
+    return utils.get_setting('PLACEHOLDER_URL')
+
+
+def lqip_placeholder(thumbnailer, thumbnail_options):
+    """
+    Return a ``data:`` URI of a tiny preview of the source image.
+
+    """
+    if thumbnailer is None:
+        return
+    source = thumbnailer.get_source_cache()
+    if source and source.preview:
+        return source.preview
+    return _cached(thumbnailer, 'lqip', make_lqip)
+
+
+def color_placeholder(thumbnailer, thumbnail_options):
+    """
+    Return a ``data:`` URI of a single pixel image of the source image's
+    dominant color.
+
+    """
+    if thumbnailer is None:
+        return
+    source = thumbnailer.get_source_cache()
+    if source and source.dominant_color:
+        return color_data_uri(parse_color(source.dominant_color))
+    return _cached(thumbnailer, 'color',
+                   lambda image: color_data_uri(get_dominant_color(image)))
+
+
+PLACEHOLDERS = {
+    'static': static_placeholder,
+    'lqip': lqip_placeholder,
+    'color': color_placeholder,
+}
+
+
+def _cached(thumbnailer, kind, make):
+    """
+    Return a placeholder for the thumbnailer's source from the cache, or make
+    it from the reduced source image and cache it.
+
+    The cache key includes the source's modification time (if the storage is
+    local), so a modified source gets a new placeholder. A source which can't
+    be read as an image is cached as having no placeholder (an empty string),
+    so it isn't read again.
+
+    """
+    key = 'easy_thumbnails:placeholder:%s:%s' % (kind, md5_constructor(
+        smart_str('%s:%s:%s' % (
+            utils.get_storage_hash(thumbnailer.source_storage),
+            thumbnailer.name, thumbnailer.get_source_modtime()))
+        ).hexdigest())
+    value = cache.get(key)
+    if value is None:
+        image = _reduced_source(thumbnailer)
+        if image is None:
+            value = ''
+        else:
+            value = make(image)
+        cache.set(key, value)
+    return value
+
+
+def _reduced_source(thumbnailer):
+    """
+    Return the thumbnailer's source image reduced to fit within
+    ``LQIP_SIZE``, or ``None`` if it can't be read as an image.
+
+    The source is decoded by the source generators, so the
+    ``THUMBNAIL_OVERSIZE_POLICY`` setting applies, and isn't read at all if
+    it was already found to be unreadable.
+
+    """
+    if thumbnailer.source_unreadable():
+        return
+    image = engine.generate_source_image(thumbnailer, {})
+    if image is None:
+        return
+    return reduce_image(image)
+
+
+def reduce_image(image):
+    """
+    Return an RGB copy of a PIL image reduced to fit within ``LQIP_SIZE``.
+
+    """
+    if image.mode not in ('RGB', 'L', 'RGBA'):
+        # PIL can't resize some modes (such as 16 bit grayscale) with
+        # antialiasing.
+        image = image.convert('RGB')
+    width, height = image.size
+    scale = min(float(LQIP_SIZE) / width, float(LQIP_SIZE) / height, 1)
+    size = (max(int(round(width * scale)), 1),
+            max(int(round(height * scale)), 1))
+    image = image.resize(size, Image.ANTIALIAS)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def data_uri(image, format='PNG'):
+    """
+    Return a ``data:`` URI of a PIL image.
+
+    """
+    data = StringIO()
+    image.save(data, format)
+    return 'data:image/%s;base64,%s' % (format.lower(),
+                                        base64.b64encode(data.getvalue()))
+
+
+def make_lqip(image):
+    """
+    Return a ``data:`` URI of a low quality image placeholder for a PIL image
+    (which has usually already been reduced with ``reduce_image``).
+
+    """
+    if max(image.size) > LQIP_SIZE or image.mode != 'RGB':
+        image = reduce_image(image)
+    return data_uri(image.filter(ImageFilter.SMOOTH))
+
+
+def get_dominant_color(image):
+    """
+    Return the most common color of a PIL image as an ``(r, g, b)`` tuple,
+    after reducing the image to a handful of colors.
+
+    """
+    if max(image.size) > LQIP_SIZE or image.mode != 'RGB':
+        image = reduce_image(image)
+    reduced = image.convert('P', palette=Image.ADAPTIVE, colors=4)
+    count, index = max(reduced.getcolors())
+    palette = reduced.getpalette()
+    return tuple(palette[index * 3:index * 3 + 3])
+
+
+def color_data_uri(color):
+    """
+    Return a ``data:`` URI of a single pixel image of an ``(r, g, b)`` color.
+
+    """
+    return data_uri(Image.new('RGB', (1, 1), tuple(color)))
+
+
+def make_preview(image):
+    """
+    Return a tuple of the low quality image placeholder ``data:`` URI and the
+    dominant color (as a ``#rrggbb`` string) of a PIL image.
+
+    """
+    image = reduce_image(image)
+    return make_lqip(image), '#%02x%02x%02x' % get_dominant_color(image)
+
+
+def preview_callback(previews):
+    """
+    Return a source callback for ``engine.generate_thumbnail`` which appends
+    the ``make_preview`` tuple of the source image to the ``previews`` list.
+
+    Errors making the preview are logged rather than raised, so they never
+    stop the thumbnail being generated (``previews`` is just left empty).
+
+    """
+    def callback(image):
+        try:
+            previews.append(make_preview(image))
+        except Exception:
+            logger.exception("Couldn't make a preview of a %s source image",
+                             image.mode)
+    return callback
+
+
+def parse_color(color):
+    """
+    Return the ``(r, g, b)`` tuple of a ``#rrggbb`` color string.
+
+    """
+    return tuple([int(color[i:i + 2], 16) for i in (1, 3, 5)])
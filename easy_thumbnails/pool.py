@@ -0,0 +1,153 @@
+from django.core.files.base import ContentFile
+from easy_thumbnails import engine, placeholders, utils
+import logging
+import multiprocessing
+import threading
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _initialize_worker():
+    """
+    Warm up a new worker process so that the first thumbnail it generates
+    doesn't pay for initializing PIL's image plugins.
+
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        import Image
+    Image.init()
+
+
+def _generate(source_data, thumbnail_options, filenames, quality, optimize,
+              preview=False):
+    """
+    Generate a thumbnail (in a worker process), returning a tuple of the
+    thumbnail filename and the saved image data (and the source preview, or
+    ``None`` if it couldn't be made, if ``preview`` is ``True``).
+
+    """
+    previews = []
+    if preview:
+        source_callback = placeholders.preview_callback(previews)
+    else:
+        source_callback = None
+    filename, data, image = engine.generate_thumbnail(
+        ContentFile(source_data), thumbnail_options, filenames, quality,
+        optimize=optimize, source_callback=source_callback)
+    if preview:
+        return filename, data, previews and previews[0] or None
+    return filename, data
+
+
+def is_enabled():
+    """
+    Return whether thumbnails should be generated in the persistent pool of
+    worker processes (i.e. the ``THUMBNAIL_WORKER_PROCESSES`` setting is
+    greater than zero).
+
+    """
+    return bool(utils.get_setting('WORKER_PROCESSES'))
+
+
+def start_pool():
+    """
+    Start the worker pool ahead of time, if it is enabled, returning whether
+    it was started.
+
+    Call this from the WSGI module (before the server starts any threads) so
+    that the workers are forked from a single threaded process, rather than
+    from a request thread when the first thumbnail is generated::
+
+        from easy_thumbnails import pool
+        pool.start_pool()
+
+    """
+    if not is_enabled():
+        return False
+    get_pool()
+    return True
+
+
+def get_pool():
+    """
+    Return the worker pool, starting it if necessary.
+
+    Starting the pool from a thread other than the main thread logs a
+    warning, since the forked workers inherit any lock held by the other
+    threads at the time (see ``start_pool``).
+
+    """
+    global _pool
+    if _pool is None:
+        # Threads of a multithreaded server could otherwise start a pool each.
+        _pool_lock.acquire()
+        try:
+            if _pool is None:
+                if threading.current_thread().name != 'MainThread':
+                    logger.warning(
+                        "Starting the thumbnail worker pool from a thread; "
+                        "call easy_thumbnails.pool.start_pool() before the "
+                        "server starts its threads instead")
+                _pool = multiprocessing.Pool(
+                    utils.get_setting('WORKER_PROCESSES'), _initialize_worker)
+        finally:
+            _pool_lock.release()
+    return _pool
+
+
+def close_pool():
+    """
+    Stop the worker pool (it will be started again if it is needed).
+
+    """
+    global _pool
+    _pool_lock.acquire()
+    try:
+        if _pool is not None:
+            _pool.terminate()
+            _pool.join()
+            _pool = None
+    finally:
+        _pool_lock.release()
+
+
+def generate(source_data, thumbnail_options, filenames, quality,
+             optimize=False, preview=False):
+    """
+    Generate a thumbnail in the worker pool, using the same arguments as
+    :func:`easy_thumbnails.engine.generate_thumbnail` (apart from
+    ``source_data`` being the contents of the source file).
+
+    Returns a tuple of the thumbnail filename and the saved image data (and,
+    if ``preview`` is ``True``, the source's preview as returned by
+    :func:`easy_thumbnails.placeholders.make_preview`), or
+    ``None`` if the thumbnail couldn't be generated within the
+    ``THUMBNAIL_WORKER_TIMEOUT`` (or the worker failed), in which case the
+    caller should fall back to generating the thumbnail itself.
+    ``engine.NoSourceGenerator`` is raised as it is by
+    ``generate_thumbnail``, since the source couldn't be read in the current
+    process either.
+
+    Note that a worker which times out isn't stopped, so while the caller
+    generates the thumbnail itself the work is done twice. Set the timeout
+    comfortably above the slowest expected generation.
+
+    """
+    try:
+        result = get_pool().apply_async(_generate, (source_data,
+            thumbnail_options, filenames, quality, optimize, preview))
+        return result.get(utils.get_setting('WORKER_TIMEOUT'))
+    except engine.NoSourceGenerator:
+        raise
+    except multiprocessing.TimeoutError:
+        logger.warning("Timed out generating %s in the worker pool",
+                       filenames[0])
+    except Exception:
+        logger.exception("Failed generating %s in the worker pool",
+                         filenames[0])
+    return None
@@ -0,0 +1,130 @@
+"""
+Profiling of slow thumbnail generation.
+
+When the ``THUMBNAIL_PROFILE_THRESHOLD`` setting is set, each thumbnail is
+generated under ``cProfile``. If generating it took longer than the threshold,
+the profile is dumped to the ``THUMBNAIL_PROFILE_DIR`` directory (as a
+``.prof`` file which can be read with ``pstats``) along with a ``.json`` file
+of the source image details and thumbnail options. The
+``thumbnail_profiles`` management command summarizes these dumps.
+
+"""
+from django.utils import simplejson
+from easy_thumbnails import utils
+from timeit import default_timer
+import cProfile
+import datetime
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def get_directory():
+    """
+    Return the directory profiles are dumped to (the
+    ``THUMBNAIL_PROFILE_DIR`` setting, defaulting to an
+    ``easy_thumbnails_profiles`` directory in the system's temporary
+    directory).
+
+    """
+    return (utils.get_setting('PROFILE_DIR') or
+            os.path.join(tempfile.gettempdir(), 'easy_thumbnails_profiles'))
+
+
+def start():
+    """
+    Start profiling, returning a tuple of the profiler and the starting time to
+    pass to ``finish`` (or ``None`` if profiling isn't enabled).
+
+    """
+    if utils.get_setting('PROFILE_THRESHOLD') is None:
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler, default_timer()
+
+
+def finish(profile, source, image, thumbnail_options):
+    """
+    Stop profiling, dumping the profile if it took longer than the threshold.
+
+    ``profile`` is the value returned by ``start``, ``source`` the source file
+    and ``image`` the decoded source image (or ``None`` if it couldn't be
+    decoded).
+
+    Returns the base path (without the extension) of the dumped files, or
+    ``None`` if nothing was dumped. Errors dumping the profile are logged
+    rather than raised, so they never affect the thumbnail being generated.
+
+    """
+    if profile is None:
+        return
+    profiler, started = profile
+    profiler.disable()
+    elapsed = default_timer() - started
+    if elapsed <= utils.get_setting('PROFILE_THRESHOLD'):
+        return
+    metadata = {
+        'time': elapsed,
+        'created': datetime.datetime.now().isoformat(),
+        'source': getattr(source, 'name', None),
+        'options': thumbnail_options,
+    }
+    if image is not None:
+        metadata.update({'size': image.size, 'mode': image.mode,
+                         'format': image.format})
+    try:
+        return _dump(profiler, metadata)
+    except Exception:
+        logger.exception("Failed to dump the profile of %s",
+                         metadata['source'])
+
+
+def _dump(profiler, metadata):
+    directory = get_directory()
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, path = tempfile.mkstemp(
+        prefix=datetime.datetime.now().strftime('%Y%m%d%H%M%S-'),
+        suffix='.prof', dir=directory)
+    os.close(fd)
+    profiler.dump_stats(path)
+    base = os.path.splitext(path)[0]
+    f = open(base + '.json', 'w')
+    try:
+        simplejson.dump(metadata, f, default=repr)
+    finally:
+        f.close()
+    return base
+
+
+def get_dumps(directory=None):
+    """
+    Return a list of the dumped profiles as ``(metadata, profile path)``
+    tuples, slowest first.
+
+    """
+    directory = directory or get_directory()
+    if not os.path.isdir(directory):
+        return []
+    dumps = []
+    for filename in os.listdir(directory):
+        base, ext = os.path.splitext(filename)
+        if ext != '.json':
+            continue
+        path = os.path.join(directory, base + '.prof')
+        if not os.path.exists(path):
+            continue
+        f = open(os.path.join(directory, filename))
+        try:
+            try:
+                metadata = simplejson.load(f)
+            except ValueError:
+                continue
+        finally:
+            f.close()
+        dumps.append((metadata, path))
+    dumps.sort(key=lambda dump: dump[0].get('time'), reverse=True)
+    return dumps
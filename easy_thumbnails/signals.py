@@ -0,0 +1,14 @@
+from django.dispatch import Signal
+
+#: Sent (with ``sender=None``) once a stage of generating or storing a
+#: thumbnail has been timed. ``stage`` is one of ``'decode'``, ``'process'``
+#: (also providing the ``processor`` function), ``'encode'``, ``'save'`` or
+#: ``'query'`` (also providing the ``model`` queried) and ``duration`` is the
+#: time it took, in seconds.
+stage_timed = Signal(providing_args=['stage', 'duration', 'processor',
+                                     'model'])
+
+#: Sent (with ``sender=None``) when ``Thumbnailer.get_thumbnail`` has checked
+#: for an existing thumbnail, with the thumbnail ``name`` and whether it
+#: ``exists`` (i.e. whether the thumbnail was a cache hit).
+existence_checked = Signal(providing_args=['name', 'exists'])
@@ -1,16 +1,200 @@
 from PIL import Image
+from easy_thumbnails import utils
+from StringIO import StringIO
+import math
+
+# How much of a source file is read at first when reading an image's header.
+HEADER_BYTES = 16 * 1024
 
 
 def pil_image(source, **options):
     """
     Try to open the source file directly using PIL, ignoring any errors.
 
+    Source images larger than the ``THUMBNAIL_MAX_SOURCE_PIXELS`` or
+    ``THUMBNAIL_MAX_SOURCE_BYTES`` settings are handled using the
+    ``THUMBNAIL_OVERSIZE_POLICY`` setting. The image dimensions are read from
+    the image header, so this happens before the image data is decoded. If
+    the dimensions are already recorded on the source's cache reference (see
+    ``Thumbnailer.get_source_metadata``), an oversize source which the policy
+    would refuse is rejected without even opening it.
+
     """
+    metadata = get_cached_metadata(source)
+    if metadata and is_oversize_size(
+            (metadata['width'], metadata['height']), source):
+        policy = get_oversize_policy()
+        if policy is reject_oversize or (policy is draft_oversize and
+                                         metadata['format'] != 'JPEG'):
+            # Only JPEG images can be drafted.
+            return
     try:
         image = Image.open(source)
     except:
         return
+    if is_oversize(image, source):
+        image = get_oversize_policy()(image, source, **options)
+        if image is None:
+            return
     # Image.open() is a lazy operation, so force the load so the source file
     # can be closed again if appropriate.
     image.load()
     return image
+
+
+def get_oversize_policy():
+    """
+    Return the handler of the ``THUMBNAIL_OVERSIZE_POLICY`` setting.
+
+    """
+    policy = utils.get_setting('OVERSIZE_POLICY')
+    handler = OVERSIZE_POLICIES.get(policy)
+    if handler is None:
+        handler = utils.dynamic_import(policy)
+    return handler
+
+
+def get_cached_metadata(source):
+    """
+    Return the ``width``, ``height`` and ``format`` of a source image recorded
+    on its cache reference (see ``Thumbnailer.get_source_metadata``) as a
+    dictionary, or ``None`` if they aren't known (or the source isn't a
+    thumbnailer).
+
+    Only a reference the thumbnailer has already loaded is used (as it has
+    when getting a thumbnail), so this never queries the database.
+
+    """
+    get_source_cache = getattr(source, 'get_source_cache', None)
+    if get_source_cache is None:
+        return
+    cached = get_source_cache(query=False)
+    if cached and cached.width and cached.height:
+        return {'width': cached.width, 'height': cached.height,
+                'format': cached.format}
+
+
+def is_oversize(image, source=None):
+    """
+    Return whether an (unloaded) image exceeds the maximum number of pixels
+    or its source file exceeds the maximum number of bytes.
+
+    """
+    return is_oversize_size(image.size, source)
+
+
+def is_oversize_size(size, source=None):
+    """
+    Return whether an image of ``size`` (a ``(width, height)`` tuple) exceeds
+    the maximum number of pixels or its source file exceeds the maximum number
+    of bytes.
+
+    """
+    max_pixels = utils.get_setting('MAX_SOURCE_PIXELS')
+    if max_pixels and size[0] * size[1] > max_pixels:
+        return True
+    max_bytes = utils.get_setting('MAX_SOURCE_BYTES')
+    if max_bytes and source is not None:
+        size = get_file_size(source)
+        if size and size > max_bytes:
+            return True
+    return False
+
+
+def get_file_size(source):
+    """
+    Return the size in bytes of a source file, or ``None`` if it can't be
+    determined.
+
+    """
+    try:
+        return source.size
+    except (AttributeError, OSError):
+        pass
+    try:
+        position = source.tell()
+        source.seek(0, 2)
+        size = source.tell()
+        source.seek(position)
+    except (AttributeError, IOError):
+        return None
+    return size
+
+
+def reject_oversize(image, source, **options):
+    """
+    Oversize policy which refuses to decode the image.
+
+    """
+    return None
+
+
+def draft_oversize(image, source, **options):
+    """
+    Oversize policy which has PIL decode the image at a reduced size (for
+    JPEG images, this is much faster and uses far less memory).
+
+    The image is reduced to fit within ``THUMBNAIL_MAX_SOURCE_PIXELS``, and if
+    the source file is larger than ``THUMBNAIL_MAX_SOURCE_BYTES`` it is
+    reduced in proportion too. Any image which drafting can't reduce enough
+    (such as a non-JPEG image) is refused.
+
+    """
+    x, y = image.size
+    scale = 1
+    max_pixels = utils.get_setting('MAX_SOURCE_PIXELS')
+    if max_pixels:
+        scale = max(scale, math.sqrt(x * y / float(max_pixels)))
+    max_bytes = utils.get_setting('MAX_SOURCE_BYTES')
+    if max_bytes:
+        size = get_file_size(source)
+        if size and size > max_bytes:
+            scale = max(scale, math.sqrt(size / float(max_bytes)))
+    if scale > 1:
+        # PIL chooses the smallest power of two reduction which is still
+        # at least the requested size, so ask for half the size which
+        # would fit to be sure the result does.
+        image.draft(image.mode, (int(x / scale / 2), int(y / scale / 2)))
+        reduced_x, reduced_y = image.size
+        if reduced_x * reduced_y * scale * scale > x * y:
+            # Drafting didn't reduce the image enough (or at all).
+            return None
+    return image
+
+
+def read_metadata(source):
+    """
+    Return a dictionary of the ``width``, ``height``, ``format`` and ``mode``
+    of a source image file (read from the current position), or ``None`` if it
+    can't be read as an image.
+
+    Only the image header is parsed, the image data isn't decoded. At first
+    only ``HEADER_BYTES`` of the file are read (so remote storages which read
+    lazily only transfer that much), reading the rest of the file only if the
+    header is larger than that (for example, a JPEG image with a large EXIF
+    block).
+
+    """
+    data = source.read(HEADER_BYTES)
+    image = _open_header(data)
+    if image is None and len(data) == HEADER_BYTES:
+        data += source.read()
+        image = _open_header(data)
+    if image is None:
+        return
+    width, height = image.size
+    return {'width': width, 'height': height, 'format': image.format or '',
+            'mode': image.mode}
+
+
+def _open_header(data):
+    try:
+        return Image.open(StringIO(data))
+    except Exception:
+        return
+
+
+OVERSIZE_POLICIES = {
+    'reject': reject_oversize,
+    'draft': draft_oversize,
+}
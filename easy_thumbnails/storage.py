@@ -1,5 +1,17 @@
-from django.core.files.storage import FileSystemStorage
-from easy_thumbnails import utils 
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db.models import get_models
+from django.db.models.signals import class_prepared
+from django.db.models.fields.files import FileField
+from easy_thumbnails import utils
+from multiprocessing.pool import ThreadPool
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_delete_pool = None
+_delete_pool_lock = threading.Lock()
+_storage_index = None
 
 
 class ThumbnailFileSystemStorage(FileSystemStorage):
@@ -16,3 +28,185 @@ class ThumbnailFileSystemStorage(FileSystemStorage):
         base_url = utils.get_setting('MEDIA_URL', override=base_url) or None
         super(ThumbnailFileSystemStorage, self).__init__(location, base_url,
                                                          *args, **kwargs)
+
+
+def get_delete_pool():
+    """
+    Return the pool of threads used by ``delete_files`` by default, starting
+    it if necessary (with ``THUMBNAIL_THREADS`` threads).
+
+    It is separate from the ``easy_thumbnails.parallel`` pool so that files
+    can be deleted from within that pool's tasks without waiting on the pool
+    itself.
+
+    """
+    global _delete_pool
+    if _delete_pool is None:
+        _delete_pool_lock.acquire()
+        try:
+            if _delete_pool is None:
+                _delete_pool = ThreadPool(utils.get_setting('THREADS'))
+        finally:
+            _delete_pool_lock.release()
+    return _delete_pool
+
+
+def delete_files(storage, names, pool=None):
+    """
+    Delete a list of files from a storage, returning a list of the names of
+    the files which were deleted.
+
+    If the storage provides a ``delete_many`` method (for example, an object
+    store which can delete multiple objects in a single request), it is
+    passed the whole list of names. Otherwise, the files are deleted
+    concurrently using ``pool`` (a ``multiprocessing`` thread pool, which
+    mustn't be the pool this is being called from), defaulting to the pool
+    returned by ``get_delete_pool``.
+
+    Failures are logged rather than raised, leaving the files which couldn't
+    be deleted out of the returned list (if ``delete_many`` fails, none of the
+    files are treated as deleted).
+
+    """
+    names = list(names)
+    if not names:
+        return []
+    delete_many = getattr(storage, 'delete_many', None)
+    if delete_many is not None:
+        try:
+            delete_many(names)
+        except Exception:
+            logger.exception("Failed to delete %s files", len(names))
+            return []
+        return names
+    if pool is None:
+        pool = get_delete_pool()
+    deleted = pool.map(_delete_file, [(storage, name) for name in names])
+    return [name for name, ok in zip(names, deleted) if ok]
+
+
+def _delete_file(args):
+    storage, name = args
+    try:
+        storage.delete(name)
+    except Exception:
+        logger.exception("Failed to delete %s", name)
+        return False
+    return True
+
+
+def get_named_storages():
+    """
+    Return a list of ``(name, storage)`` tuples of the known storage instances:
+    the default storage (``'default'``), the default thumbnail storage
+    (``'thumbnails'``) and the storage and thumbnail storage of each model
+    file field (``'app_label.Model.field'`` and
+    ``'app_label.Model.field:thumbnails'``).
+
+    """
+    from easy_thumbnails.files import DEFAULT_THUMBNAIL_STORAGE
+    storages = [('default', default_storage),
+                ('thumbnails', DEFAULT_THUMBNAIL_STORAGE)]
+    for model in get_models():
+        for field in model._meta.fields:
+            if isinstance(field, FileField):
+                name = '%s.%s.%s' % (model._meta.app_label,
+                                     model._meta.object_name, field.name)
+                storages.append((name, field.storage))
+                thumbnail_storage = getattr(field, 'thumbnail_storage', None)
+                if thumbnail_storage is not None:
+                    storages.append(('%s:thumbnails' % name,
+                                     thumbnail_storage))
+    return storages
+
+
+def get_storage_name(storage):
+    """
+    Return the name of a storage instance (see ``get_named_storages``), or
+    ``None`` if it isn't a known storage.
+
+    """
+    names, storages = _get_storage_index()
+    known = names.get(id(storage))
+    if known is not None and known[0] is storage:
+        return known[1]
+
+
+def get_named_storage(name):
+    """
+    Return the storage instance with a name from ``get_named_storages``, or
+    ``None`` if there is no such storage.
+
+    """
+    names, storages = _get_storage_index()
+    return storages.get(name)
+
+
+def clear_storage_index():
+    """
+    Forget the named storages found by ``get_storage_name`` and
+    ``get_named_storage``, so they are looked for again (this happens
+    automatically when a model class is prepared, but is needed if a field's
+    storage is replaced).
+
+    """
+    global _storage_index
+    _storage_index = None
+
+
+def _get_storage_index():
+    """
+    Return a tuple of the known storages' names keyed by the ``id`` of the
+    storage (as ``(storage, name)`` tuples) and the storages keyed by name,
+    built only once rather than for every URL.
+
+    """
+    global _storage_index
+    index = _storage_index
+    if index is None:
+        names = {}
+        storages = {}
+        for name, storage in get_named_storages():
+            names.setdefault(id(storage), (storage, name))
+            storages[name] = storage
+        index = _storage_index = names, storages
+    return index
+
+
+def _clear_storage_index(sender, **kwargs):
+    clear_storage_index()
+
+class_prepared.connect(_clear_storage_index)
+
+
+def get_storages():
+    """
+    Return a dictionary of the known storages (the default storages and those
+    used by any model file field), keyed by their storage hash.
+
+    Storage hashes are based on the storage class, so if differently
+    configured instances of a class are found (for example,
+    ``FileSystemStorage`` instances with different locations), the files of
+    that storage hash can't be told apart and it is left out (with a logged
+    warning).
+
+    """
+    storages = {}
+    ambiguous = set()
+    for name, storage in get_named_storages():
+        storage_hash = utils.get_storage_hash(storage)
+        known = storages.setdefault(storage_hash, storage)
+        if known is not storage and (_configuration(known) !=
+                                     _configuration(storage)):
+            ambiguous.add(storage_hash)
+    for storage_hash in ambiguous:
+        logger.warning("Differently configured storages share the storage "
+                       "hash %s (of %s), so it is ignored", storage_hash,
+                       storages[storage_hash].__class__.__name__)
+        del storages[storage_hash]
+    return storages
+
+
+def _configuration(storage):
+    return (getattr(storage, 'location', None),
+            getattr(storage, 'base_url', None))
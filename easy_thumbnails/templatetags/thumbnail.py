@@ -1,7 +1,7 @@
-from django.template import Library, Node, VariableDoesNotExist, \
+from django.template import Library, Node, Variable, VariableDoesNotExist, \
     TemplateSyntaxError
-from easy_thumbnails import utils
-from easy_thumbnails.files import get_thumbnailer
+from easy_thumbnails import placeholders, utils
+from easy_thumbnails.files import LazyThumbnailFile, get_thumbnailer
 from django.utils.html import escape
 import re
 
@@ -13,6 +13,21 @@ VALID_OPTIONS = utils.valid_processor_options()
 VALID_OPTIONS.remove('size')
 
 
+def parse_size(size):
+    """
+    Return a size string in the ``[width]x[height]`` format as a tuple of two
+    integers (or ``None`` if it isn't valid). Any other size is returned
+    untouched.
+
+    """
+    if isinstance(size, basestring):
+        m = RE_SIZE.match(size)
+        if not m:
+            return
+        return (int(m.group(1)), int(m.group(2)))
+    return size
+
+
 def split_args(args):
     """
     Split a list of argument strings into a dictionary where each key is an
@@ -33,11 +48,45 @@ def split_args(args):
     return args_dict
 
 
+def is_static(value):
+    """
+    Return whether a (compiled) option value is a literal, which can be
+    resolved without a context.
+
+    """
+    if not hasattr(value, 'resolve'):
+        return True
+    if value.filters:
+        return False
+    var = value.var
+    # Translated literals still need resolving at render time, in the active
+    # language.
+    return (not isinstance(var, Variable) or
+            (var.literal is not None and not var.translate))
+
+
 class ThumbnailNode(Node):
     def __init__(self, source_var, opts, context_name=None):
         self.source_var = source_var
-        self.opts = opts
         self.context_name = context_name
+        # Resolve the literal option values (and parse a literal size) now,
+        # so that only the variable options are resolved on each render.
+        self.opts = {}
+        self.variable_opts = []
+        for key, value in opts.iteritems():
+            key = str(key)
+            if is_static(value):
+                if hasattr(value, 'resolve'):
+                    value = value.resolve({})
+                if key == 'size':
+                    value = parse_size(value)
+                    if value is None:
+                        # Leave invalid sizes to be reported when rendering.
+                        self.variable_opts.append((key, opts[key]))
+                        continue
+                self.opts[key] = value
+            else:
+                self.variable_opts.append((key, value))
 
     def render(self, context):
         # Note that this isn't a global constant because we need to change the
@@ -51,48 +100,68 @@ class ThumbnailNode(Node):
                 raise VariableDoesNotExist("Variable '%s' does not exist." %
                         self.source_var)
             return self.bail_out(context)
-        # Resolve the thumbnail option values.
-        try:
-            opts = {}
-            for key, value in self.opts.iteritems():
-                if hasattr(value, 'resolve'):
-                    value = value.resolve(context)
-                opts[str(key)] = value
-        except:
-            if raise_errors:
-                raise
-            return self.bail_out(context)
-        # Size variable can be either a tuple/list of two integers or a
-        # valid string, only the string is checked.
-        size = opts['size']
-        if isinstance(size, basestring):
-            m = RE_SIZE.match(size)
-            if m:
-                opts['size'] = (int(m.group(1)), int(m.group(2)))
-            else:
-                if raise_errors:
-                    raise TemplateSyntaxError("Variable '%s' was resolved "
-                            "but '%s' is not a valid size." %
-                            (self.size_var, size))
+        if self.variable_opts:
+            opts = self.resolve_opts(context, raise_errors)
+            if opts is None:
                 return self.bail_out(context)
+        else:
+            opts = self.opts
 
+        thumbnailer = None
         try:
-            thumbnail = get_thumbnailer(source).get_thumbnail(opts)
+            thumbnailer = get_thumbnailer(source)
+            if self.context_name is None:
+                thumbnail = thumbnailer.get_thumbnail(opts)
         except:
             if raise_errors:
                 raise
-            return self.bail_out(context)
-        # Return the thumbnail file url, or put the file on the context.
+            return self.bail_out(context, thumbnailer, opts)
+        # Return the thumbnail file url, or put the file on the context (which
+        # is only got once the template uses it).
         if self.context_name is None:
             return escape(thumbnail.url)
         else:
-            context[self.context_name] = thumbnail
+            context[self.context_name] = LazyThumbnailFile(
+                thumbnailer, opts, fail_silently=not raise_errors)
             return ''
 
-    def bail_out(self, context):
+    def resolve_opts(self, context, raise_errors):
+        """
+        Return the thumbnail options, resolving the variable option values (or
+        ``None`` if they couldn't be resolved).
+
+        """
+        opts = dict(self.opts)
+        try:
+            for key, value in self.variable_opts:
+                opts[key] = value.resolve(context)
+        except:
+            if raise_errors:
+                raise
+            return
+        # Size variable can be either a tuple/list of two integers or a
+        # valid string, only the string is checked.
+        size = parse_size(opts['size'])
+        if size is None:
+            if raise_errors:
+                raise TemplateSyntaxError("Variable '%s' was resolved but "
+                        "'%s' is not a valid size." %
+                        (dict(self.variable_opts)['size'], opts['size']))
+            return
+        opts['size'] = size
+        return opts
+
+    def bail_out(self, context, thumbnailer=None, opts=None):
+        """
+        Return the placeholder's URL (see ``THUMBNAIL_PLACEHOLDER``) in place
+        of a thumbnail which couldn't be got, or set the context variable to an
+        empty string.
+
+        """
         if self.context_name:
             context[self.context_name] = ''
-        return ''
+            return ''
+        return escape(placeholders.get_placeholder_url(thumbnailer, opts))
 
 
 def thumbnail(parser, token):
@@ -126,14 +195,17 @@ def thumbnail(parser, token):
         {% thumbnail [source] [size] [options] as [variable] %}
 
     When ``as [variable]`` is used, the tag does not return the absolute URL of
-    the thumbnail. 
+    the thumbnail. The thumbnail isn't looked for (or generated) until the
+    template uses the variable, so a thumbnail that the template only uses
+    conditionally costs nothing when it isn't used. Set the
+    ``THUMBNAIL_LAZY_URL`` setting to also build the variable's ``url``
+    without looking for the thumbnail.
 
     **Debugging**
 
     By default, if there is an error creating the thumbnail or resolving the
     image variable then the thumbnail tag will just return an empty string (and
-    if there was a context variable to be set then it will also be set to an empty
-    string).
+    if there was a context variable to be set then it will also be empty).
 
     For example, you will not see an error if the thumbnail could not
     be written to directory because of permissions error. To display those
@@ -184,3 +256,41 @@ def thumbnail(parser, token):
 
 
 register.tag(thumbnail)
+
+
+def thumbnail_preview(source):
+    """
+    Return the stored preview of a source file (a ``data:`` URI of a tiny
+    version of the image, see the ``THUMBNAIL_SOURCE_PREVIEWS`` setting), or
+    an empty string if there isn't one::
+
+        <img src="{{ person.photo|thumbnail_preview }}">
+
+    """
+    try:
+        return get_thumbnailer(source).get_preview()
+    except:
+        if utils.get_setting('DEBUG'):
+            raise
+        return ''
+
+
+def dominant_color(source):
+    """
+    Return the stored dominant color of a source file (as a ``#rrggbb``
+    string, see the ``THUMBNAIL_SOURCE_PREVIEWS`` setting), or an empty string
+    if there isn't one::
+
+        <div style="background: {{ person.photo|dominant_color }}">
+
+    """
+    try:
+        return get_thumbnailer(source).get_dominant_color()
+    except:
+        if utils.get_setting('DEBUG'):
+            raise
+        return ''
+
+
+register.filter(thumbnail_preview)
+register.filter(dominant_color)
@@ -1,3 +1,16 @@
-from easy_thumbnails.tests.fields import ThumbnailerFieldTest
-from easy_thumbnails.tests.processors import ScaleAndCropTest
-from easy_thumbnails.tests.templatetags import ThumbnailTagTest 
+from easy_thumbnails.tests.benchmark import BenchmarkTest
+from easy_thumbnails.tests.engine import SaveImageTest, PipelineTest, \
+    WorkerPoolTest
+from easy_thumbnails.tests.fields import ThumbnailerFieldTest, \
+    DeleteFilesTest
+from easy_thumbnails.tests.management import CleanupTest, ThumbnailIndexTest, \
+    CachedThumbnailsTest
+from easy_thumbnails.tests.metrics import MetricsTest
+from easy_thumbnails.tests.models import FileManagerTest
+from easy_thumbnails.tests.parallel import ParallelTest
+from easy_thumbnails.tests.placeholders import PlaceholderTest
+from easy_thumbnails.tests.profiling import ProfilingTest
+from easy_thumbnails.tests.processors import ScaleAndCropTest, AutocropTest
+from easy_thumbnails.tests.source_generators import PilImageTest
+from easy_thumbnails.tests.templatetags import ThumbnailTagTest
+from easy_thumbnails.tests.views import ThumbnailViewTest
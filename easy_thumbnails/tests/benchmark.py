@@ -0,0 +1,46 @@
+from django.core.files.storage import FileSystemStorage
+from easy_thumbnails import benchmark, models
+from easy_thumbnails.tests.utils import BaseTest
+
+
+class BenchmarkTest(BaseTest):
+    def test_run(self):
+        results = benchmark.run(iterations=1, fixtures=['small-rgb'],
+                                isolate=False)
+        names = results['benchmarks'].keys()
+        for name in ('pil_image[small-rgb]',
+                     'processors.scale_and_crop[small-rgb]',
+                     'save_image[small-rgb]',
+                     'thumbnail_exists[small-rgb]',
+                     'template_tag[small-rgb]',
+                     'template_tag(generate)[small-rgb]',
+                     'get_thumbnail_name'):
+            self.assert_(name in names, name)
+        result = results['benchmarks']['pil_image[small-rgb]']
+        self.assertEqual(result['iterations'], 1)
+        self.assert_(result['min'] <= result['median'] <= result['mean'])
+        # The temporary sources' cache references are removed.
+        self.assertEqual(models.Source.objects.count(), 0)
+
+    def test_other_sources_kept(self):
+        storage = FileSystemStorage(location='/srv/media')
+        models.Source.objects.get_file(storage, 'photo.jpg', create=True)
+        benchmark.run(iterations=1, fixtures=['small-rgb'],
+                      match='get_thumbnail_name', isolate=False)
+        self.assertEqual(models.Source.objects.count(), 1)
+
+    def test_isolated(self):
+        results = benchmark.run(iterations=2, fixtures=['small-rgb'],
+                                match='pil_image')
+        self.assertEqual(results['benchmarks'].keys(),
+                         ['pil_image[small-rgb]'])
+        self.assertEqual(results['benchmarks']['pil_image[small-rgb]']
+                         ['iterations'], 2)
+
+    def test_compare(self):
+        previous = {'benchmarks': {'a': {'median': 2.0},
+                                   'b': {'median': 1.0}}}
+        current = {'benchmarks': {'a': {'median': 1.0},
+                                  'c': {'median': 1.0}}}
+        self.assertEqual(benchmark.compare(previous, current),
+                         [('a', 2.0, 1.0, 0.5)])
@@ -0,0 +1,164 @@
+try:
+    from PIL import Image, ImageChops
+except ImportError:
+    import Image, ImageChops
+from django.conf import settings
+from easy_thumbnails import engine, pool, processors
+from easy_thumbnails.tests.utils import BaseTest
+from easy_thumbnails.tests.processors import create_image
+from unittest import TestCase
+from StringIO import StringIO
+import random
+import re
+
+
+class SaveImageTest(TestCase):
+    def test_jpeg_saved_once(self):
+        image = create_image()
+        data = engine.save_image(image, filename='test.jpg').read()
+        # Only a single JPEG stream should be written.
+        self.assertEqual(data.count('\xff\xd9'), 1)
+
+    def test_optimize_png(self):
+        # An opaque image using 200 colors.
+        r = random.Random(0)
+        colors = [(r.randrange(256), r.randrange(256), r.randrange(256))
+                  for i in range(200)]
+        image = Image.new('RGB', (200, 200))
+        image.putdata([r.choice(colors) for i in range(200 * 200)])
+        image.info['comment'] = 'metadata'
+        optimized = engine.optimize_image(image, 'PNG')
+        self.assertEqual(optimized.mode, 'P')
+        self.assertEqual(optimized.info, {})
+        # The original image keeps its metadata.
+        self.assertEqual(image.info, {'comment': 'metadata'})
+        self.assertEqual(
+            ImageChops.difference(optimized.convert('RGB'), image).getbbox(),
+            None)
+        original_size = len(engine.save_image(image, filename='test.png')
+                            .read())
+        optimized_size = len(engine.save_image(optimized, filename='test.png',
+                                               optimize=1).read())
+        self.assert_(optimized_size < original_size)
+
+    def test_optimize_strips_metadata(self):
+        image = Image.new('RGB', (10, 10))
+        image.info['icc_profile'] = 'profile'
+        optimized = engine.optimize_image(image, 'JPEG')
+        self.assertEqual(optimized.info, {})
+        self.assertEqual(image.info, {'icc_profile': 'profile'})
+
+    def test_optimize_keeps_many_colors(self):
+        image = Image.new('RGB', (32, 32))
+        image.putdata([(i % 256, i // 256, 0) for i in range(32 * 32)])
+        optimized = engine.optimize_image(image, 'PNG')
+        self.assertEqual(optimized.mode, 'RGB')
+
+    def test_optimize_keeps_transparency(self):
+        image = Image.new('RGBA', (10, 10))
+        optimized = engine.optimize_image(image, 'PNG')
+        self.assertEqual(optimized.mode, 'RGBA')
+
+
+def custom_processor(im, **kwargs):
+    return im
+
+
+class PipelineTest(TestCase):
+    processors = [processors.colorspace, processors.autocrop,
+                  processors.scale_and_crop, processors.filters,
+                  custom_processor]
+
+    def test_skip_inactive(self):
+        pipeline = engine.get_pipeline({'size': (100, 100), 'crop': True,
+                                        'sharpen': False}, self.processors)
+        self.assertEqual(pipeline, [processors.colorspace,
+                                    processors.scale_and_crop,
+                                    custom_processor])
+
+    def test_active(self):
+        pipeline = engine.get_pipeline({'size': (100, 100), 'autocrop': True,
+                                        'detail': True}, self.processors)
+        self.assertEqual(pipeline, self.processors)
+
+    def test_cached(self):
+        pipeline = engine.get_pipeline({'size': (100, 100), 'bw': True},
+                                       self.processors)
+        self.assert_(engine.get_pipeline({'size': (50, 50), 'bw': True},
+                                         self.processors) is pipeline)
+
+    def test_defer_colorspace(self):
+        options = {'size': (100, 100)}
+        pipeline = engine.get_pipeline(options, self.processors, mode='CMYK')
+        self.assertEqual(pipeline, [processors.scale_and_crop,
+                                    processors.colorspace, custom_processor])
+        # Not deferred for other modes, or when another processor is run
+        # between the two.
+        pipeline = engine.get_pipeline(options, self.processors, mode='P')
+        self.assertEqual(pipeline[0], processors.colorspace)
+        options['autocrop'] = True
+        pipeline = engine.get_pipeline(options, self.processors, mode='CMYK')
+        self.assertEqual(pipeline[0], processors.colorspace)
+
+    def test_defer_colorspace_output(self):
+        image = create_image().convert('CMYK')
+        options = {'size': (100, 100)}
+        expected = processors.scale_and_crop(processors.colorspace(image),
+                                             **options)
+        thumbnail = engine.process_image(image, options, self.processors)
+        self.assertEqual(thumbnail.mode, 'RGB')
+        self.assertEqual(thumbnail.size, expected.size)
+        # Resampling in CMYK can only differ by rounding.
+        extrema = ImageChops.difference(thumbnail, expected).getextrema()
+        self.assert_(max([high for low, high in extrema]) <= 2, extrema)
+
+
+class WorkerPoolTest(BaseTest):
+    def setUp(self):
+        BaseTest.setUp(self)
+        settings.THUMBNAIL_WORKER_PROCESSES = 1
+
+    def tearDown(self):
+        pool.close_pool()
+        BaseTest.tearDown(self)
+
+    def test_generate(self):
+        data = StringIO()
+        create_image().save(data, 'JPEG')
+        filename, thumbnail_data = pool.generate(data.getvalue(),
+            {'size': (100, 100)}, ('test.jpg', 'test.png'), 85)
+        self.assertEqual(filename, 'test.jpg')
+        image = Image.open(StringIO(thumbnail_data))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (100, 75))
+
+    def test_generate_preview(self):
+        data = StringIO()
+        create_image().save(data, 'JPEG')
+        filename, thumbnail_data, preview = pool.generate(data.getvalue(),
+            {'size': (100, 100)}, ('test.jpg', 'test.png'), 85, preview=True)
+        self.assertEqual(filename, 'test.jpg')
+        lqip, color = preview
+        self.assert_(lqip.startswith('data:image/png;base64,'))
+        self.assert_(re.match('#[0-9a-f]{6}$', color), color)
+
+    def test_start_pool(self):
+        self.assert_(pool.start_pool())
+        self.assert_(pool._pool is not None)
+        self.assert_(pool.get_pool() is pool._pool)
+        pool.close_pool()
+        settings.THUMBNAIL_WORKER_PROCESSES = 0
+        self.failIf(pool.start_pool())
+        self.assertEqual(pool._pool, None)
+
+    def test_failure(self):
+        data = StringIO()
+        create_image().save(data, 'JPEG')
+        self.assertEqual(pool.generate(data.getvalue(), {'size': ('a', 'b')},
+                                       ('test.jpg', 'test.png'), 85), None)
+
+    def test_unreadable(self):
+        # Not a worker failure, so the caller doesn't try again.
+        self.assertRaises(engine.NoSourceGenerator, pool.generate,
+                          'not an image', {'size': (100, 100)},
+                          ('test.jpg', 'test.png'), 85)
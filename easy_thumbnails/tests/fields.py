@@ -1,18 +1,40 @@
+from django.conf import settings
 from django.db import models
 from django.core.files.base import ContentFile
+from easy_thumbnails import engine, parallel, source_generators
 from easy_thumbnails.tests.utils import BaseTest, TemporaryStorage
 from easy_thumbnails.fields import ThumbnailerField
+from easy_thumbnails.files import delete_thumbnails_for
+from easy_thumbnails.models import Source
+from easy_thumbnails.storage import delete_files
 try:
     from PIL import Image
 except ImportError:
     import Image
 from StringIO import StringIO
+from multiprocessing.pool import ThreadPool
+import os
+import re
 
 
 class TestModel(models.Model):
     avatar = ThumbnailerField(upload_to='avatars')
 
 
+class FakeQuerySet(object):
+    """
+    Just enough of a queryset for ``delete_thumbnails_for`` (the test model
+    has no database table).
+
+    """
+    def __init__(self, model, values):
+        self.model = model
+        self.values = values
+
+    def values_list(self, *fields, **kwargs):
+        return self.values
+
+
 class ThumbnailerFieldTest(BaseTest):
     def setUp(self):
         BaseTest.setUp(self)
@@ -43,8 +65,207 @@ class ThumbnailerFieldTest(BaseTest):
         instance.avatar.delete(save=False)
         self.assertEqual(self.storage.listdir('avatars')[1], [])
 
+    def test_shard_dirs(self):
+        instance = TestModel(avatar='avatars/avatar.jpg')
+        instance.avatar.thumbnail_shard_depth = 2
+        name = instance.avatar.get_thumbnail_name({'size': (300, 300)})
+        path, filename = os.path.split(name)
+        self.assertEqual(filename, 'avatar.jpg.300x300_q85.jpg')
+        self.assert_(re.match(r'avatars/[0-9a-f]{2}/[0-9a-f]{2}$', path), path)
+        # The shards depend on the source name and options.
+        self.assertEqual(
+            instance.avatar.get_thumbnail_name({'size': (300, 300)}), name)
+        self.assertNotEqual(os.path.split(
+            instance.avatar.get_thumbnail_name({'size': (200, 200)}))[0],
+            path)
+        thumb = instance.avatar.get_thumbnail({'size': (300, 300)})
+        self.assertEqual(thumb.name, name)
+        self.assert_(self.storage.exists(name))
+
+    def test_hashed_names(self):
+        instance = TestModel(avatar='avatars/avatar.jpg')
+        instance.avatar.thumbnail_hashed_names = True
+        name = instance.avatar.get_thumbnail_name({'size': (300, 300),
+                                                   'crop': True})
+        self.assert_(re.match(r'avatars/[0-9a-f]{32}\.jpg$', name), name)
+        self.assertNotEqual(
+            instance.avatar.get_thumbnail_name({'size': (300, 300)}), name)
+        instance.avatar.get_thumbnail({'size': (300, 300), 'crop': True})
+        self.assert_(self.storage.exists(name))
+        thumbnail_cache = instance.avatar.get_thumbnail_cache(name)
+        self.assertEqual(thumbnail_cache.options, '300x300_q85_crop')
+
     def test_get_thumbnails(self):
         instance = TestModel(avatar='avatars/avatar.jpg')
         instance.avatar.get_thumbnail({'size': (300, 300)})
         instance.avatar.get_thumbnail({'size': (200, 200)})
         self.assertEqual(len(list(instance.avatar.get_thumbnails())), 2)
+
+    def test_source_cache_reused(self):
+        instance = TestModel(avatar='avatars/avatar.jpg')
+        instance.avatar.get_thumbnail({'size': (300, 300)})
+        # The source row loaded for the first thumbnail is reused, so only the
+        # new thumbnail row is written.
+        self.assertNumQueries(1, instance.avatar.get_thumbnail,
+                              {'size': (200, 200)})
+        self.assertEqual(len(list(instance.avatar.get_thumbnails())), 2)
+
+    def test_source_cache_memoized(self):
+        instance = TestModel(avatar='avatars/avatar.jpg')
+        self.assertEqual(instance.avatar.get_source_cache(), None)
+        self.assertNumQueries(0, instance.avatar.get_source_cache)
+        source = instance.avatar.get_source_cache(create=True)
+        self.assertNumQueries(0, instance.avatar.get_source_cache)
+        self.assertEqual(instance.avatar.get_source_cache(), source)
+        # Saving a new source file invalidates the memoized reference.
+        instance.avatar.save('avatar.jpg', ContentFile('new'), save=False)
+        new_source = instance.avatar.get_source_cache()
+        self.assertNotEqual(new_source.pk, source.pk)
+        self.assertEqual(new_source.name, instance.avatar.name)
+
+    def test_unreadable_source(self):
+        self.storage.save('avatars/broken.jpg', ContentFile('not an image'))
+        instance = TestModel(avatar='avatars/broken.jpg')
+        self.assertRaises(engine.NoSourceGenerator,
+                          instance.avatar.get_thumbnail, {'size': (50, 50)})
+        source = instance.avatar.get_source_cache()
+        self.assert_(source.unreadable_modified)
+        # Following attempts don't read the source again.
+        instance = TestModel(avatar='avatars/broken.jpg')
+        self.assertNumQueries(1, self.assertRaises, engine.NoSourceGenerator,
+                              instance.avatar.get_thumbnail, {'size': (50, 50)})
+        self.assert_(instance.avatar.source_unreadable())
+        # Until the source is modified.
+        data = StringIO()
+        Image.new('RGB', (100, 100)).save(data, 'JPEG')
+        f = self.storage.open('avatars/broken.jpg', 'wb')
+        f.write(data.getvalue())
+        f.close()
+        path = self.storage.path('avatars/broken.jpg')
+        modtime = os.path.getmtime(path) + 10
+        os.utime(path, (modtime, modtime))
+        instance = TestModel(avatar='avatars/broken.jpg')
+        self.failIf(instance.avatar.source_unreadable())
+        instance.avatar.get_thumbnail({'size': (50, 50)})
+        self.assertEqual(instance.avatar.get_source_cache().unreadable_modified,
+                         None)
+
+    def test_source_metadata(self):
+        instance = TestModel(avatar='avatars/avatar.jpg')
+        metadata = {'width': 800, 'height': 600, 'format': 'JPEG',
+                    'mode': 'RGB'}
+        self.assertEqual(instance.avatar.get_source_metadata(), metadata)
+        self.assertEqual(instance.avatar.get_source_cache().width, 800)
+        # Following lookups use the stored metadata.
+        instance = TestModel(avatar='avatars/avatar.jpg')
+        instance.avatar.open = None
+        self.assertNumQueries(1, instance.avatar.get_source_metadata)
+        self.assertEqual(instance.avatar.get_source_metadata(), metadata)
+        # Until the source is modified.
+        data = StringIO()
+        Image.new('L', (100, 50)).save(data, 'PNG')
+        f = self.storage.open('avatars/avatar.jpg', 'wb')
+        f.write(data.getvalue())
+        f.close()
+        path = self.storage.path('avatars/avatar.jpg')
+        modtime = os.path.getmtime(path) + 10
+        os.utime(path, (modtime, modtime))
+        instance = TestModel(avatar='avatars/avatar.jpg')
+        self.assertEqual(instance.avatar.get_source_metadata(),
+            {'width': 100, 'height': 50, 'format': 'PNG', 'mode': 'L'})
+
+    def test_source_metadata_oversize(self):
+        instance = TestModel(avatar='avatars/avatar.jpg')
+        instance.avatar.get_source_metadata()
+        settings.THUMBNAIL_MAX_SOURCE_PIXELS = 800 * 600 - 1
+        # The stored dimensions reject the source without reading it.
+        instance = TestModel(avatar='avatars/avatar.jpg')
+        instance.avatar.get_source_cache()
+        opened = []
+        self.storage.open = lambda *args: opened.append(args)
+        try:
+            self.assertEqual(source_generators.pil_image(instance.avatar),
+                             None)
+        finally:
+            del self.storage.open
+        self.assertEqual(opened, [])
+        # JPEG images can be drafted, which needs the image header.
+        settings.THUMBNAIL_OVERSIZE_POLICY = 'draft'
+        instance = TestModel(avatar='avatars/avatar.jpg')
+        instance.avatar.get_source_cache()
+        image = source_generators.pil_image(instance.avatar)
+        self.assert_(image.size[0] * image.size[1] < 800 * 600)
+        # Other formats can't be.
+        Source.objects.filter(name='avatars/avatar.jpg').update(
+            format='PNG')
+        instance = TestModel(avatar='avatars/avatar.jpg')
+        instance.avatar.get_source_cache()
+        self.storage.open = lambda *args: opened.append(args)
+        try:
+            self.assertEqual(source_generators.pil_image(instance.avatar),
+                             None)
+        finally:
+            del self.storage.open
+        self.assertEqual(opened, [])
+
+    def test_delete_thumbnails_for(self):
+        instance = TestModel(avatar='avatars/avatar.jpg')
+        instance.avatar.get_thumbnail({'size': (300, 300)})
+        instance.avatar.get_thumbnail({'size': (200, 200)})
+        queryset = FakeQuerySet(TestModel, ['avatars/avatar.jpg', ''])
+        self.assertEqual(delete_thumbnails_for(queryset), 2)
+        self.assertEqual(self.storage.listdir('avatars')[1], ['avatar.jpg'])
+        self.assertEqual(len(list(instance.avatar.get_thumbnails())), 0)
+
+
+class DeleteManyStorage(TemporaryStorage):
+    deleted = None
+
+    def delete_many(self, names):
+        self.deleted = names
+
+
+class DeleteFilesTest(BaseTest):
+    def setUp(self):
+        BaseTest.setUp(self)
+        self.storage = TemporaryStorage()
+        for name in ('a.txt', 'b.txt', 'c.txt'):
+            self.storage.save(name, ContentFile('test'))
+
+    def tearDown(self):
+        self.storage.delete_temporary_storage()
+        BaseTest.tearDown(self)
+
+    def test_delete_files(self):
+        delete_files(self.storage, ['a.txt', 'c.txt'])
+        self.assertEqual(self.storage.listdir('')[1], ['b.txt'])
+
+    def test_delete_files_pool(self):
+        pool = ThreadPool(1)
+        try:
+            self.assertEqual(
+                delete_files(self.storage, ['a.txt', 'c.txt'], pool=pool),
+                ['a.txt', 'c.txt'])
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(self.storage.listdir('')[1], ['b.txt'])
+
+    def test_delete_files_in_thread_pool(self):
+        # Deleting from within a task of the (single thread) parallel pool
+        # doesn't wait on that pool.
+        settings.THUMBNAIL_THREADS = 1
+        parallel.close_thread_pool()
+        try:
+            result = parallel.get_thread_pool().apply_async(
+                delete_files, (self.storage, ['a.txt', 'b.txt']))
+            self.assertEqual(result.get(10), ['a.txt', 'b.txt'])
+        finally:
+            parallel.close_thread_pool()
+        self.assertEqual(self.storage.listdir('')[1], ['c.txt'])
+
+    def test_delete_many(self):
+        storage = DeleteManyStorage()
+        delete_files(storage, ['a.txt', 'b.txt'])
+        self.assertEqual(storage.deleted, ['a.txt', 'b.txt'])
+        storage.delete_temporary_storage()
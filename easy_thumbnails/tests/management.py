@@ -0,0 +1,278 @@
+from django.core.files.base import ContentFile
+from easy_thumbnails import management, models, utils
+from easy_thumbnails.files import Thumbnailer, get_thumbnailer
+from easy_thumbnails.management.commands import thumbnail_cleanup
+from easy_thumbnails.tests.utils import BaseTest, TemporaryStorage
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+from StringIO import StringIO
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+
+class FailingDeleteStorage(TemporaryStorage):
+    def delete(self, name):
+        raise IOError("Can't delete %s" % name)
+
+
+class CleanupTest(BaseTest):
+    def setUp(self):
+        BaseTest.setUp(self)
+        self.storage = TemporaryStorage()
+        self.storages = {utils.get_storage_hash(self.storage): self.storage}
+        data = StringIO()
+        Image.new('RGB', (800, 600)).save(data, 'JPEG')
+        for name in ('kept.jpg', 'removed.jpg'):
+            self.storage.save(name, ContentFile(data.getvalue()))
+            thumbnailer = get_thumbnailer(self.storage, name)
+            thumbnailer.thumbnail_storage = self.storage
+            thumbnailer.get_thumbnail({'size': (100, 100)})
+            thumbnailer.get_thumbnail({'size': (50, 50)})
+            thumbnailer.close()
+        self.storage.delete('removed.jpg')
+
+    def tearDown(self):
+        self.storage.delete_temporary_storage()
+        BaseTest.tearDown(self)
+
+    def test_dry_run(self):
+        stats = thumbnail_cleanup.clean_up(dry_run=True, chunk_size=1,
+                                           storages=self.storages)
+        self.assertEqual(stats, {'sources': 2, 'missing': 1,
+                                 'thumbnails': 2})
+        self.assertEqual(models.Thumbnail.objects.count(), 4)
+        self.assertEqual(len(self.storage.listdir('')[1]), 5)
+
+    def test_clean_up(self):
+        stats = thumbnail_cleanup.clean_up(chunk_size=1,
+                                           storages=self.storages)
+        self.assertEqual(stats, {'sources': 2, 'missing': 1,
+                                 'thumbnails': 2})
+        self.assertEqual(
+            list(models.Source.objects.values_list('name', flat=True)),
+            ['kept.jpg'])
+        self.assertEqual(models.Thumbnail.objects.count(), 2)
+        files = self.storage.listdir('')[1]
+        files.sort()
+        self.assertEqual(files, ['kept.jpg', 'kept.jpg.100x100_q85.jpg',
+                                 'kept.jpg.50x50_q85.jpg'])
+
+    def test_unknown_thumbnail_storage(self):
+        # A thumbnail of the missing source on a storage which isn't known.
+        source = models.Source.objects.get(name='removed.jpg')
+        models.Thumbnail.objects.create(storage_hash='unknown',
+                                        name='removed.jpg.10x10_q85.jpg',
+                                        source=source)
+        stats = thumbnail_cleanup.clean_up(storages=self.storages)
+        self.assertEqual(stats['thumbnails'], 2)
+        # The unknown thumbnail's reference is kept, along with its source.
+        self.assertEqual(
+            list(models.Thumbnail.objects.filter(source=source)
+                 .values_list('name', flat=True)),
+            ['removed.jpg.10x10_q85.jpg'])
+
+    def test_failed_delete(self):
+        storage = FailingDeleteStorage(self.storage.temporary_location)
+        storages = {utils.get_storage_hash(self.storage): storage}
+        stats = thumbnail_cleanup.clean_up(storages=storages)
+        self.assertEqual(stats['thumbnails'], 0)
+        self.assertEqual(models.Thumbnail.objects.count(), 4)
+        self.assertEqual(models.Source.objects.count(), 2)
+
+    def test_unknown_storage(self):
+        stats = thumbnail_cleanup.clean_up(storages={})
+        self.assertEqual(stats['missing'], 0)
+        self.assertEqual(models.Source.objects.count(), 2)
+
+
+class ThumbnailIndexTest(TestCase):
+    files = [
+        'photos/1.jpg',
+        'photos/1.jpg.100x100_q85.jpg',
+        'photos/1.jpg.50x50_q95_crop_sharpen.jpg',
+        'photos/my_photo.png.50x50_q85_crop-smart.png',
+        'photos/thumbs/2_jpg_100x100_crop_q85.jpg',
+        'other/3.gif.10x10_q85.jpg',
+    ]
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        for filename in self.files:
+            filename = os.path.join(self.path, filename)
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            open(filename, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_index(self):
+        index = management.ThumbnailIndex(self.path, subdir='thumbs')
+        sources = index.thumbnails.keys()
+        sources.sort()
+        self.assertEqual(sources, ['other/3.gif', 'photos/1.jpg',
+                                   'photos/2.jpg', 'photos/my_photo.png'])
+        thumbs = index.thumbnails_for('photos/1.jpg')
+        thumbs.sort(key=lambda thumb: thumb['x'])
+        self.assertEqual([(t['x'], t['quality'], t['options'])
+                          for t in thumbs],
+                         [('100', '85', []), ('50', '95', ['crop', 'sharpen'])])
+        self.assertEqual(index.thumbnails_for('photos/2.jpg')[0]['options'],
+                         ['crop'])
+        self.assertEqual(
+            index.thumbnails_for('photos/my_photo.png')[0]['options'],
+            ['crop-smart'])
+
+    def test_delete(self):
+        index = management.ThumbnailIndex(self.path, subdir='thumbs')
+        self.assertEqual(management.delete_thumbnails('photos/1.jpg',
+                                                      index=index), 2)
+        self.assertEqual(index.thumbnails_for('photos/1.jpg'), [])
+        self.assertEqual(os.listdir(os.path.join(self.path, 'other')),
+                         ['3.gif.10x10_q85.jpg'])
+        self.assertEqual(management.delete_all_thumbnails(self.path,
+                                                          index=index), 3)
+        files = os.listdir(os.path.join(self.path, 'photos'))
+        files.sort()
+        self.assertEqual(files, ['1.jpg', 'thumbs'])
+
+    def test_save(self):
+        index = management.ThumbnailIndex(self.path, subdir='thumbs')
+        filename = os.path.join(self.path, 'index')
+        index.save(filename)
+        loaded = management.ThumbnailIndex.load(filename)
+        self.assertEqual(loaded.path, index.path)
+        self.assertEqual(loaded.thumbnails, index.thumbnails)
+
+    def test_thumbnails_for_file(self):
+        thumbs = management.thumbnails_for_file('photos/1.jpg',
+            root=self.path, basedir='', subdir='', prefix='')
+        self.assertEqual(len(thumbs), 2)
+
+    def test_shards(self):
+        for filename in ('photos/ab/cd/1.jpg.20x20_q85.jpg',
+                         'photos/thumbs/0f/9e/2_jpg_20x20_q85.jpg',
+                         '5a/e3/4.jpg.20x20_q85.jpg'):
+            filename = os.path.join(self.path, filename)
+            os.makedirs(os.path.dirname(filename))
+            open(filename, 'w').close()
+        index = management.ThumbnailIndex(self.path, subdir='thumbs',
+                                          shard_depth=2)
+        self.assertEqual(len(index.thumbnails_for('photos/1.jpg')), 3)
+        self.assertEqual(len(index.thumbnails_for('photos/2.jpg')), 2)
+        self.assertEqual(len(index.thumbnails_for('4.jpg')), 1)
+
+
+class CachedThumbnailsTest(BaseTest):
+    def setUp(self):
+        BaseTest.setUp(self)
+        self.path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.path, 'photos'))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        BaseTest.tearDown(self)
+
+    def test_shards(self):
+        thumbnailer = Thumbnailer(None, name='photos/1.jpg')
+        thumbnailer.thumbnail_shard_depth = 2
+        sharded = thumbnailer.get_thumbnail_name({'size': (20, 20)})
+        source = models.Source.objects.create(storage_hash='test',
+                                              name='photos/1.jpg')
+        models.Thumbnail.objects.create(storage_hash='test', name=sharded,
+                                        source=source, options='20x20_q85')
+        # Another hexadecimal named directory isn't taken to be a shard.
+        for filename in (sharded, 'photos/1.jpg.10x10_q85.jpg',
+                         'photos/ab/cd/1.jpg.30x30_q85.jpg'):
+            filename = os.path.join(self.path, filename)
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            open(filename, 'w').close()
+        thumbs = management.thumbnails_for_file('photos/1.jpg',
+            root=self.path, basedir='', subdir='', prefix='', shard_depth=2)
+        thumbs.sort(key=lambda thumb: int(thumb['x']))
+        self.assertEqual([thumb['x'] for thumb in thumbs], ['10', '20'])
+        self.assertEqual(thumbs[1]['filename'],
+                         os.path.join(self.path, sharded))
+
+    def create_hashed(self, options, storage_hash='test'):
+        thumbnailer = Thumbnailer(None, name='photos/1.jpg')
+        thumbnailer.thumbnail_hashed_names = True
+        hashed = thumbnailer.get_thumbnail_name(options)
+        source, created = models.Source.objects.get_or_create(
+            storage_hash=storage_hash, name='photos/1.jpg')
+        models.Thumbnail.objects.create(
+            storage_hash=storage_hash, name=hashed, source=source,
+            options=thumbnailer.get_options_string(options))
+        open(os.path.join(self.path, hashed), 'w').close()
+        return hashed
+
+    def test_hashed_names(self):
+        hashed = self.create_hashed({'size': (20, 20), 'crop': True})
+        open(os.path.join(self.path, 'photos/1.jpg.10x10_q85.jpg'),
+             'w').close()
+        thumbs = management.thumbnails_for_file('photos/1.jpg',
+            root=self.path, basedir='', subdir='', prefix='',
+            hashed_names=True, storage_hashes=['test'])
+        thumbs.sort(key=lambda thumb: int(thumb['x']))
+        self.assertEqual([(t['x'], t['quality'], t['options'])
+                          for t in thumbs],
+                         [('10', '85', []), ('20', '85', ['crop'])])
+        self.assertEqual(thumbs[1]['filename'],
+                         os.path.join(self.path, hashed))
+        index = management.ThumbnailIndex(self.path, prefix='', subdir='',
+            hashed_names=True, root=self.path, storage_hashes=['test'])
+        thumbs = index.thumbnails_for('photos/1.jpg')
+        self.assertEqual(len(thumbs), 2)
+        self.assertEqual(management.delete_thumbnails('photos/1.jpg',
+                                                      index=index), 2)
+        self.assertEqual(os.listdir(os.path.join(self.path, 'photos')), [])
+
+    def test_hashed_names_off(self):
+        self.create_hashed({'size': (20, 20)})
+        # The thumbnail cache isn't used at all.
+        options = dict(root=self.path, basedir='', subdir='', prefix='',
+                       hashed_names=False)
+        self.assertNumQueries(0, management.thumbnails_for_file,
+                              'photos/1.jpg', **options)
+        self.assertEqual(
+            management.thumbnails_for_file('photos/1.jpg', **options), [])
+        index = management.ThumbnailIndex(self.path, prefix='', subdir='',
+                                          hashed_names=False)
+        self.assertEqual(index.thumbnails, {})
+        self.assertEqual(index.unmatched, [])
+
+    def test_hashed_names_storage(self):
+        # Only the cache entries of the storage at the root are used.
+        self.create_hashed({'size': (20, 20)}, storage_hash='other')
+        thumbs = management.thumbnails_for_file('photos/1.jpg',
+            root=self.path, basedir='', subdir='', prefix='',
+            hashed_names=True, storage_hashes=['test'])
+        self.assertEqual(thumbs, [])
+        index = management.ThumbnailIndex(self.path, prefix='', subdir='',
+            hashed_names=True, root=self.path, storage_hashes=['test'])
+        self.assertEqual(index.thumbnails, {})
+        self.assertEqual(len(index.unmatched), 1)
+
+    def test_hashed_names_delete_all(self):
+        hashed = self.create_hashed({'size': (20, 20)})
+        # A hashed file without a cache entry.
+        unknown = 'photos/%s.jpg' % ('0' * 32)
+        open(os.path.join(self.path, unknown), 'w').close()
+        open(os.path.join(self.path, 'photos/kept.jpg'), 'w').close()
+        # Indexing a subdirectory of the storage root.
+        index = management.ThumbnailIndex(os.path.join(self.path, 'photos'),
+            prefix='', subdir='', hashed_names=True, root=self.path,
+            storage_hashes=['test'])
+        self.assertEqual([thumb['filename']
+                          for thumb in index.thumbnails_for('photos/1.jpg')],
+                         [os.path.join(self.path, hashed)])
+        self.assertEqual(index.unmatched, [os.path.join(self.path, unknown)])
+        self.assertEqual(management.delete_all_thumbnails(
+            os.path.join(self.path, 'photos'), index=index), 2)
+        self.assertEqual(os.listdir(os.path.join(self.path, 'photos')),
+                         ['kept.jpg'])
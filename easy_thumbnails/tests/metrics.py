@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from easy_thumbnails import metrics, models, processors, signals
+from easy_thumbnails.files import get_thumbnailer
+from easy_thumbnails.tests.utils import BaseTest, TemporaryStorage
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+from StringIO import StringIO
+import functools
+
+
+class FakeClient(object):
+    """
+    A statsd style client which remembers the stats it was sent.
+
+    """
+    def __init__(self):
+        self.stats = []
+
+    def timing(self, stat, time):
+        self.stats.append(('timing', stat))
+
+    def incr(self, stat, count=1):
+        self.stats.append(('incr', stat))
+
+client = FakeClient()
+
+
+class CallableProcessor(object):
+    def __call__(self, image, **kwargs):
+        return image
+
+
+class MetricsTest(BaseTest):
+    def setUp(self):
+        BaseTest.setUp(self)
+        self.storage = TemporaryStorage()
+        data = StringIO()
+        Image.new('RGB', (800, 600)).save(data, 'JPEG')
+        data.seek(0)
+        self.storage.save('test.jpg', ContentFile(data.read()))
+        self.stages = []
+        self.checks = []
+
+    def tearDown(self):
+        signals.stage_timed.disconnect(self.stage_timed)
+        signals.existence_checked.disconnect(self.existence_checked)
+        client.stats = []
+        self.storage.delete_temporary_storage()
+        BaseTest.tearDown(self)
+
+    def stage_timed(self, sender, stage, duration, processor, model,
+                    **kwargs):
+        self.assert_(duration >= 0)
+        self.stages.append((stage, processor and processor.__name__ or
+                            model and model.__name__))
+
+    def existence_checked(self, sender, name, exists, **kwargs):
+        self.checks.append(exists)
+
+    def get_thumbnail(self):
+        thumbnailer = get_thumbnailer(self.storage, 'test.jpg')
+        thumbnailer.thumbnail_storage = self.storage
+        return thumbnailer.get_thumbnail({'size': (100, 100)})
+
+    def test_disabled(self):
+        self.assertEqual(metrics.start(), None)
+        self.assertEqual(metrics.timing('decode', None), None)
+
+    def test_signals(self):
+        signals.stage_timed.connect(self.stage_timed)
+        signals.existence_checked.connect(self.existence_checked)
+        self.get_thumbnail()
+        self.assertEqual(self.stages, [
+            ('query', 'Source'),
+            ('decode', None),
+            ('process', 'colorspace'),
+            ('process', 'scale_and_crop'),
+            ('encode', None),
+            ('save', None),
+            ('query', 'Source'),
+            ('query', 'Thumbnail'),
+        ])
+        self.assertEqual(self.checks, [False])
+        self.get_thumbnail()
+        self.assertEqual(self.checks, [False, True])
+
+    def test_client(self):
+        settings.THUMBNAIL_METRICS = 'easy_thumbnails.tests.metrics.client'
+        self.get_thumbnail()
+        self.get_thumbnail()
+        stats = client.stats
+        self.assert_(('timing', 'easy_thumbnails.decode') in stats)
+        self.assert_(('timing', 'easy_thumbnails.process.scale_and_crop')
+                     in stats)
+        self.assert_(('timing', 'easy_thumbnails.query.thumbnail') in stats)
+        self.assertEqual(stats.count(('incr', 'easy_thumbnails.exists.miss')),
+                         1)
+        self.assertEqual(stats.count(('incr', 'easy_thumbnails.exists.hit')),
+                         1)
+
+    def test_processor_names(self):
+        settings.THUMBNAIL_METRICS = 'easy_thumbnails.tests.metrics.client'
+        started = metrics.start()
+        metrics.timing('process', started, processor=CallableProcessor())
+        metrics.timing('process', started,
+                       processor=functools.partial(processors.colorspace))
+        self.assertEqual(client.stats, [
+            ('timing', 'easy_thumbnails.process.CallableProcessor'),
+            ('timing', 'easy_thumbnails.process.partial'),
+        ])
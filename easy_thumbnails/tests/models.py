@@ -0,0 +1,68 @@
+import datetime
+
+from django.db import IntegrityError
+from easy_thumbnails import models
+from easy_thumbnails.tests.utils import BaseTest, TemporaryStorage
+
+
+class FileManagerTest(BaseTest):
+    def setUp(self):
+        BaseTest.setUp(self)
+        self.storage = TemporaryStorage()
+
+    def tearDown(self):
+        self.storage.delete_temporary_storage()
+        BaseTest.tearDown(self)
+
+    def test_get_file(self):
+        self.assertEqual(models.Source.objects.get_file(self.storage,
+                                                        'test.jpg'), None)
+        source = models.Source.objects.get_file(self.storage, 'test.jpg',
+                                                create=True)
+        self.assertEqual(
+            models.Source.objects.get_file(self.storage, 'test.jpg',
+                                           create=True).pk, source.pk)
+        self.assertEqual(models.Source.objects.count(), 1)
+
+    def test_unique(self):
+        source = models.Source.objects.get_file(self.storage, 'test.jpg',
+                                                create=True)
+        duplicate = models.Source(storage_hash=source.storage_hash,
+                                  name=source.name)
+        self.assertRaises(IntegrityError, duplicate.save)
+
+    def test_get_file_update_modified(self):
+        modified = datetime.datetime(2010, 1, 1)
+        # A new row is inserted with a single query.
+        self.assertNumQueries(1, models.Source.objects.get_file, self.storage,
+                              'test.jpg', create=True,
+                              update_modified=modified)
+        source = models.Source.objects.get(name='test.jpg')
+        self.assertEqual(source.modified, modified)
+        # An existing row is updated rather than duplicated.
+        modified = datetime.datetime(2011, 1, 1)
+        updated = models.Source.objects.get_file(
+            self.storage, 'test.jpg', create=True, update_modified=modified)
+        self.assertEqual(updated.pk, source.pk)
+        self.assertEqual(updated.modified, modified)
+        self.assertEqual(models.Source.objects.get(pk=source.pk).modified,
+                         modified)
+        self.assertEqual(models.Source.objects.count(), 1)
+
+    def test_get_file_without_unique_keys(self):
+        manager = models.Source.objects
+        manager.has_unique_keys = lambda: False
+        try:
+            modified = datetime.datetime(2010, 1, 1)
+            source = manager.get_file(self.storage, 'test.jpg', create=True,
+                                      update_modified=modified)
+            self.assertEqual(source.modified, modified)
+            # The row is looked for rather than inserted again.
+            modified = datetime.datetime(2011, 1, 1)
+            updated = manager.get_file(self.storage, 'test.jpg', create=True,
+                                       update_modified=modified)
+            self.assertEqual(updated.pk, source.pk)
+            self.assertEqual(manager.get(pk=source.pk).modified, modified)
+            self.assertEqual(manager.count(), 1)
+        finally:
+            del manager.has_unique_keys
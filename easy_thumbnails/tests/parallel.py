@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from easy_thumbnails import parallel
+from easy_thumbnails.files import get_thumbnailer
+from easy_thumbnails.tests.utils import BaseTest, TemporaryStorage
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+from StringIO import StringIO
+import threading
+
+
+class ParallelTest(BaseTest):
+    restore_settings = ['THUMBNAIL_PLACEHOLDER', 'THUMBNAIL_PLACEHOLDER_URL',
+                        'THUMBNAIL_DEBUG']
+
+    def setUp(self):
+        BaseTest.setUp(self)
+        self.storage = TemporaryStorage()
+        # Save a test image.
+        data = StringIO()
+        Image.new('RGB', (800, 600)).save(data, 'JPEG')
+        data.seek(0)
+        self.storage.save('test.jpg', ContentFile(data.read()))
+
+    def tearDown(self):
+        parallel.close_thread_pool()
+        self.storage.delete_temporary_storage()
+        BaseTest.tearDown(self)
+
+    def thumbnailer(self, name='test.jpg'):
+        thumbnailer = get_thumbnailer(self.storage, name)
+        thumbnailer.thumbnail_storage = self.storage
+        return thumbnailer
+
+    def test_generate_thumbnail_async(self):
+        result = parallel.generate_thumbnail_async(self.thumbnailer(),
+                                                   {'size': (100, 100)})
+        thumbnail = result.get()
+        self.assertEqual((thumbnail.width, thumbnail.height), (100, 75))
+
+    def test_gather(self):
+        thumbnails = parallel.gather([
+            (self.thumbnailer(), {'size': (100, 100)}),
+            (self.thumbnailer(), {'size': (50, 50)}),
+            (self.thumbnailer(), {'size': (20, 20), 'crop': True}),
+        ], save=False)
+        self.assertEqual([(t.width, t.height) for t in thumbnails],
+                         [(100, 75), (50, 37), (20, 20)])
+
+    def test_gather_failure(self):
+        requests = [(self.thumbnailer(), {'size': (100, 100)}),
+                    (self.thumbnailer(), {'size': 'invalid'})]
+        self.assertRaises(Exception, parallel.gather, requests, save=False)
+        thumbnails = parallel.gather(requests, save=False,
+                                     fail_silently=True)
+        self.assertEqual(thumbnails[1], None)
+        self.assertEqual(thumbnails[0].width, 100)
+
+    def test_get_thumbnail_url(self):
+        settings.THUMBNAIL_PLACEHOLDER = 'static'
+        settings.THUMBNAIL_PLACEHOLDER_URL = '/static/placeholder.png'
+        self.assertEqual(
+            parallel.get_thumbnail_url(self.thumbnailer(),
+                                       {'size': (100, 100)}, timeout=None,
+                                       save=False),
+            self.storage.url('test.jpg.100x100_q85.jpg'))
+        # A failed thumbnail gets the placeholder.
+        self.assertEqual(
+            parallel.get_thumbnail_url(self.thumbnailer(),
+                                       {'size': 'invalid'}, timeout=None,
+                                       save=False),
+            '/static/placeholder.png')
+
+    def test_get_thumbnail_url_pending(self):
+        settings.THUMBNAIL_PLACEHOLDER = 'static'
+        settings.THUMBNAIL_PLACEHOLDER_URL = '/static/placeholder.png'
+        thumbnailer = self.thumbnailer()
+        get_thumbnail = thumbnailer.get_thumbnail
+        started = threading.Event()
+        finish = threading.Event()
+        thumbnails = []
+
+        def slow_get_thumbnail(*args, **kwargs):
+            started.set()
+            finish.wait()
+            thumbnails.append(get_thumbnail(*args, **kwargs))
+            return thumbnails[-1]
+        thumbnailer.get_thumbnail = slow_get_thumbnail
+        try:
+            self.assertEqual(parallel.get_thumbnail_url(
+                thumbnailer, {'size': (100, 100)}, save=False),
+                '/static/placeholder.png')
+            started.wait()
+        finally:
+            finish.set()
+        # The thumbnail is still got in the background.
+        parallel.close_thread_pool()
+        self.assertEqual(thumbnails[0].width, 100)
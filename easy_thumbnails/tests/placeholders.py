@@ -0,0 +1,200 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.template import Template, Context
+from easy_thumbnails import placeholders
+from easy_thumbnails.files import LazyThumbnailFile, get_thumbnailer
+from easy_thumbnails.tests.utils import BaseTest, TemporaryStorage
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+from StringIO import StringIO
+import base64
+
+
+def custom_placeholder(thumbnailer, thumbnail_options):
+    return '/placeholder/%sx%s' % thumbnail_options['size']
+
+
+class PlaceholderTest(BaseTest):
+    restore_settings = ['THUMBNAIL_PLACEHOLDER', 'THUMBNAIL_PLACEHOLDER_URL',
+                        'THUMBNAIL_DEBUG', 'THUMBNAIL_SOURCE_PREVIEWS',
+                        'THUMBNAIL_MAX_SOURCE_PIXELS',
+                        'THUMBNAIL_OVERSIZE_POLICY']
+
+    def setUp(self):
+        BaseTest.setUp(self)
+        self.storage = TemporaryStorage()
+        # Save a mostly red test image.
+        image = Image.new('RGB', (800, 600), (255, 0, 0))
+        image.paste((0, 0, 255), (0, 0, 100, 600))
+        data = StringIO()
+        image.save(data, 'PNG')
+        self.storage.save('test.png', ContentFile(data.getvalue()))
+        self.thumbnailer = get_thumbnailer(self.storage, 'test.png')
+        self.thumbnailer.thumbnail_storage = self.storage
+        cache.clear()
+
+    def tearDown(self):
+        self.storage.delete_temporary_storage()
+        BaseTest.tearDown(self)
+
+    def decode(self, url):
+        prefix = 'data:image/png;base64,'
+        self.assert_(url.startswith(prefix), url)
+        return Image.open(StringIO(base64.b64decode(url[len(prefix):])))
+
+    def test_none(self):
+        self.assertEqual(placeholders.get_placeholder_url(self.thumbnailer),
+                         '')
+
+    def test_static(self):
+        settings.THUMBNAIL_PLACEHOLDER = 'static'
+        settings.THUMBNAIL_PLACEHOLDER_URL = '/static/placeholder.png'
+        self.assertEqual(placeholders.get_placeholder_url(None),
+                         '/static/placeholder.png')
+
+    def test_lqip(self):
+        settings.THUMBNAIL_PLACEHOLDER = 'lqip'
+        image = self.decode(
+            placeholders.get_placeholder_url(self.thumbnailer))
+        self.assertEqual(image.size, (16, 12))
+        # Without a source there is no preview.
+        self.assertEqual(placeholders.get_placeholder_url(None), '')
+
+    def test_color(self):
+        settings.THUMBNAIL_PLACEHOLDER = 'color'
+        image = self.decode(
+            placeholders.get_placeholder_url(self.thumbnailer))
+        self.assertEqual(image.size, (1, 1))
+        self.assertEqual(image.getpixel((0, 0)), (255, 0, 0))
+
+    def test_cached(self):
+        settings.THUMBNAIL_PLACEHOLDER = 'color'
+        url = placeholders.get_placeholder_url(self.thumbnailer)
+        # The source isn't read again.
+        thumbnailer = get_thumbnailer(self.storage, 'test.png')
+        thumbnailer.open = None
+        settings.THUMBNAIL_DEBUG = True
+        self.assertEqual(placeholders.get_placeholder_url(thumbnailer), url)
+
+    def test_lazy_placeholder(self):
+        settings.THUMBNAIL_PLACEHOLDER = 'static'
+        settings.THUMBNAIL_PLACEHOLDER_URL = '/static/placeholder.png'
+        lazy = LazyThumbnailFile(self.thumbnailer, {'size': (50, 50)})
+        self.assertEqual(lazy.placeholder, '/static/placeholder.png')
+        # The thumbnail isn't got for the placeholder.
+        self.failIf(self.storage.exists('test.png.50x50_q85.png'))
+        self.failIf(lazy._resolved)
+
+    def test_custom(self):
+        settings.THUMBNAIL_PLACEHOLDER = (
+            'easy_thumbnails.tests.placeholders.custom_placeholder')
+        self.assertEqual(placeholders.get_placeholder_url(
+            self.thumbnailer, {'size': (20, 30)}), '/placeholder/20x30')
+
+    def test_errors(self):
+        settings.THUMBNAIL_PLACEHOLDER = 'lqip'
+        thumbnailer = get_thumbnailer(self.storage, 'test.png')
+        thumbnailer.close()
+
+        def broken_open(mode=None):
+            raise IOError
+        thumbnailer.open = broken_open
+        self.assertEqual(placeholders.get_placeholder_url(thumbnailer), '')
+        settings.THUMBNAIL_DEBUG = True
+        self.assertRaises(IOError, placeholders.get_placeholder_url,
+                          thumbnailer)
+
+    def test_unreadable(self):
+        settings.THUMBNAIL_PLACEHOLDER = 'lqip'
+        settings.THUMBNAIL_DEBUG = True
+        self.storage.save('broken.png', ContentFile('not an image'))
+        thumbnailer = get_thumbnailer(self.storage, 'broken.png')
+        self.assertEqual(placeholders.get_placeholder_url(thumbnailer), '')
+        # The missing placeholder is cached, so the source isn't read again.
+        thumbnailer.open = None
+        self.assertEqual(placeholders.get_placeholder_url(thumbnailer), '')
+        # Sources marked as unreadable aren't read either.
+        cache.clear()
+        thumbnailer.set_source_unreadable(True)
+        self.assertEqual(placeholders.get_placeholder_url(thumbnailer), '')
+
+    def test_oversize(self):
+        settings.THUMBNAIL_PLACEHOLDER = 'color'
+        settings.THUMBNAIL_MAX_SOURCE_PIXELS = 1000
+        settings.THUMBNAIL_OVERSIZE_POLICY = 'reject'
+        self.assertEqual(placeholders.get_placeholder_url(self.thumbnailer),
+                         '')
+
+    def test_tag(self):
+        settings.THUMBNAIL_PLACEHOLDER = 'static'
+        settings.THUMBNAIL_PLACEHOLDER_URL = '/static/placeholder.png'
+        settings.THUMBNAIL_DEBUG = False
+        template = Template('{% load thumbnail %}'
+            '{% thumbnail missing 50x50 %}|'
+            '{% thumbnail source 50x50 as thumb %}{{ thumb.url }}')
+        self.storage.save('broken.png', ContentFile('not an image'))
+        source = get_thumbnailer(self.storage, 'broken.png')
+        source.thumbnail_storage = self.storage
+        self.assertEqual(template.render(Context({'source': source})),
+                         '/static/placeholder.png|/static/placeholder.png')
+
+    def test_source_previews(self):
+        settings.THUMBNAIL_SOURCE_PREVIEWS = True
+        self.assertEqual(self.thumbnailer.get_preview(), '')
+        self.thumbnailer.get_thumbnail({'size': (50, 50)})
+        self.assertEqual(self.decode(self.thumbnailer.get_preview()).size,
+                         (16, 12))
+        self.assertEqual(self.thumbnailer.get_dominant_color(), '#ff0000')
+        # They are stored on the source's cache reference.
+        thumbnailer = get_thumbnailer(self.storage, 'test.png')
+        self.assertEqual(thumbnailer.get_preview(),
+                         self.thumbnailer.get_preview())
+        self.assertEqual(thumbnailer.get_dominant_color(), '#ff0000')
+        # And used by the placeholders, without reading the source.
+        thumbnailer.read_source = None
+        settings.THUMBNAIL_DEBUG = True
+        settings.THUMBNAIL_PLACEHOLDER = 'lqip'
+        self.assertEqual(placeholders.get_placeholder_url(thumbnailer),
+                         thumbnailer.get_preview())
+        settings.THUMBNAIL_PLACEHOLDER = 'color'
+        self.assertEqual(self.decode(placeholders.get_placeholder_url(
+            thumbnailer)).getpixel((0, 0)), (255, 0, 0))
+        template = Template('{% load thumbnail %}'
+            '{{ source|dominant_color }}|{{ source|thumbnail_preview }}')
+        self.assertEqual(template.render(Context({'source': thumbnailer})),
+                         '#ff0000|%s' % thumbnailer.get_preview())
+
+    def test_source_previews_16_bit(self):
+        settings.THUMBNAIL_SOURCE_PREVIEWS = True
+        data = StringIO()
+        Image.new('I;16', (80, 60), 200).save(data, 'PNG')
+        self.storage.save('16bit.png', ContentFile(data.getvalue()))
+        thumbnailer = get_thumbnailer(self.storage, '16bit.png')
+        thumbnailer.thumbnail_storage = self.storage
+        thumbnailer.get_thumbnail({'size': (50, 50)})
+        self.assertEqual(self.decode(thumbnailer.get_preview()).size,
+                         (16, 12))
+        self.assertEqual(thumbnailer.get_dominant_color(), '#c8c8c8')
+
+    def test_source_preview_errors(self):
+        settings.THUMBNAIL_SOURCE_PREVIEWS = True
+        make_preview = placeholders.make_preview
+
+        def broken_preview(image):
+            raise ValueError
+        placeholders.make_preview = broken_preview
+        try:
+            # The thumbnail is still generated, without a preview.
+            thumbnail = self.thumbnailer.get_thumbnail({'size': (50, 50)})
+        finally:
+            placeholders.make_preview = make_preview
+        self.assert_(self.storage.exists(thumbnail.name))
+        self.assertEqual(self.thumbnailer.get_preview(), '')
+
+    def test_source_previews_off(self):
+        self.thumbnailer.get_thumbnail({'size': (50, 50)})
+        self.assertEqual(self.thumbnailer.get_preview(), '')
+        self.assertEqual(self.thumbnailer.get_dominant_color(), '')
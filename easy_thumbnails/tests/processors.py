@@ -15,12 +15,14 @@ def create_image(mode='RGB', size=(800, 600)):
     return image
 
 
-class ScaleAndCropTest(TestCase):
+class BaseImageTest(TestCase):
     def assertImagesEqual(self, im1, im2, msg=None):
         if ImageChops.difference(im1, im2).getbbox() is not None:
             raise self.failureException, \
                   (msg or 'The two images were not identical')
-    
+
+
+class ScaleAndCropTest(BaseImageTest):
     def test_scale(self):
         image = create_image()
         
@@ -86,3 +88,45 @@ class ScaleAndCropTest(TestCase):
         smart_crop = processors.scale_and_crop(image, (600, 600), crop='smart')
         expected = image.crop([78, 0, 678, 600])
         self.assertImagesEqual(smart_crop, expected)
+
+
+class AutocropTest(BaseImageTest):
+    def create_document(self, size=(2000, 1500)):
+        image = Image.new('RGB', size, 'white')
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((300, 200, 1499, 1099), 'black')
+        return image
+
+    def test_autocrop(self):
+        image = self.create_document()
+        cropped = processors.autocrop(image, autocrop=True)
+        self.assertEqual(cropped.size, (1200, 900))
+
+    def test_autocrop_fast(self):
+        image = self.create_document()
+        self.assertEqual(processors._fast_autocrop_bbox(image),
+                         (300, 200, 1500, 1100))
+        self.assertImagesEqual(processors.autocrop(image, autocrop='fast'),
+                               processors.autocrop(image, autocrop=True))
+
+    def test_autocrop_fast_thin_content(self):
+        # A large page with a thin rule and a small caption outside the main
+        # content, which must not be cropped away.
+        image = Image.new('RGB', (3000, 2000), 'white')
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((600, 400, 2399, 1599), 'black')
+        draw.rectangle((100, 1700, 2899, 1702), 'black')
+        draw.text((120, 1750), 'A small caption', fill='black')
+        left, top, right, bottom = processors._fast_autocrop_bbox(image)
+        self.assert_(left <= 100 and right >= 2900, (left, right))
+        self.assert_(top <= 400 and bottom >= 1755, (top, bottom))
+        self.assertEqual(
+            processors.autocrop(image, autocrop='fast').size,
+            (right - left, bottom - top))
+
+    def test_autocrop_blank(self):
+        image = Image.new('RGB', (800, 600), 'white')
+        self.assertEqual(processors.autocrop(image, autocrop='fast').size,
+                         (800, 600))
+        self.assertEqual(processors.autocrop(image, autocrop=True).size,
+                         (800, 600))
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from easy_thumbnails import engine, profiling
+from easy_thumbnails.files import get_thumbnailer
+from easy_thumbnails.tests.utils import BaseTest, TemporaryStorage
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+from StringIO import StringIO
+import os
+import shutil
+import tempfile
+
+
+class ProfilingTest(BaseTest):
+    def setUp(self):
+        BaseTest.setUp(self)
+        self.storage = TemporaryStorage()
+        data = StringIO()
+        Image.new('RGB', (800, 600)).save(data, 'JPEG')
+        data.seek(0)
+        self.storage.save('test.jpg', ContentFile(data.read()))
+        self.directory = tempfile.mkdtemp()
+        settings.THUMBNAIL_PROFILE_DIR = self.directory
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        self.storage.delete_temporary_storage()
+        BaseTest.tearDown(self)
+
+    def generate(self):
+        thumbnailer = get_thumbnailer(self.storage, 'test.jpg')
+        thumbnailer.thumbnail_storage = self.storage
+        thumbnailer.generate_thumbnail({'size': (100, 100)})
+
+    def test_disabled(self):
+        self.generate()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_under_threshold(self):
+        settings.THUMBNAIL_PROFILE_THRESHOLD = 60
+        self.generate()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_dump(self):
+        settings.THUMBNAIL_PROFILE_THRESHOLD = 0
+        self.generate()
+        dumps = profiling.get_dumps()
+        self.assertEqual(len(dumps), 1)
+        metadata, path = dumps[0]
+        self.assert_(os.path.exists(path))
+        self.assertEqual(metadata['source'], 'test.jpg')
+        self.assertEqual(metadata['size'], [800, 600])
+        self.assertEqual(metadata['mode'], 'RGB')
+        self.assertEqual(metadata['format'], 'JPEG')
+        self.assertEqual(metadata['options'], {'size': [100, 100]})
+        self.assert_(metadata['time'] > 0)
+        # Summarize the dumps.
+        self.generate()
+        output = StringIO()
+        call_command('thumbnail_profiles', stdout=output)
+        output = output.getvalue()
+        self.assert_(output.startswith('2 profiles found'), output)
+        self.assert_('test.jpg' in output)
+        self.assert_('process_image' in output, output)
+
+    def test_dump_failure(self):
+        settings.THUMBNAIL_PROFILE_THRESHOLD = 0
+        # A directory which can't be created (its parent is a file).
+        parent = os.path.join(self.directory, 'file')
+        open(parent, 'w').close()
+        settings.THUMBNAIL_PROFILE_DIR = os.path.join(parent, 'profiles')
+        self.generate()
+        # The original error of a failed generation isn't replaced.
+        self.storage.save('broken.jpg', ContentFile('not an image'))
+        thumbnailer = get_thumbnailer(self.storage, 'broken.jpg')
+        self.assertRaises(engine.NoSourceGenerator,
+                          thumbnailer.generate_thumbnail, {'size': (100, 100)})
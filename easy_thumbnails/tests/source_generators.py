@@ -0,0 +1,88 @@
+from django.conf import settings
+from easy_thumbnails import source_generators
+from easy_thumbnails.tests.utils import BaseTest
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+from StringIO import StringIO
+import struct
+
+
+def small_oversize(image, source, **options):
+    return Image.new('RGB', (10, 10))
+
+
+class PilImageTest(BaseTest):
+    def source(self, format='JPEG', size=(800, 600)):
+        data = StringIO()
+        Image.new('RGB', size).save(data, format)
+        data.seek(0)
+        return data
+
+    def test_no_limits(self):
+        image = source_generators.pil_image(self.source())
+        self.assertEqual(image.size, (800, 600))
+
+    def test_reject(self):
+        settings.THUMBNAIL_MAX_SOURCE_PIXELS = 800 * 600 - 1
+        self.assertEqual(source_generators.pil_image(self.source()), None)
+        settings.THUMBNAIL_MAX_SOURCE_PIXELS = 800 * 600
+        self.assert_(source_generators.pil_image(self.source()))
+
+    def test_reject_bytes(self):
+        source = self.source()
+        size = len(source.getvalue())
+        settings.THUMBNAIL_MAX_SOURCE_BYTES = size - 1
+        self.assertEqual(source_generators.pil_image(source), None)
+        settings.THUMBNAIL_MAX_SOURCE_BYTES = size
+        source.seek(0)
+        self.assert_(source_generators.pil_image(source))
+
+    def test_draft(self):
+        settings.THUMBNAIL_MAX_SOURCE_PIXELS = 400 * 300
+        settings.THUMBNAIL_OVERSIZE_POLICY = 'draft'
+        image = source_generators.pil_image(self.source())
+        self.assert_(image.size[0] * image.size[1] <= 400 * 300, image.size)
+        self.assert_(image.size[0] >= 200, image.size)
+        # Only JPEG images can be drafted.
+        self.assertEqual(source_generators.pil_image(self.source('PNG')),
+                         None)
+
+    def test_draft_bytes(self):
+        source = self.source()
+        settings.THUMBNAIL_MAX_SOURCE_BYTES = len(source.getvalue()) // 4
+        settings.THUMBNAIL_OVERSIZE_POLICY = 'draft'
+        image = source_generators.pil_image(source)
+        self.assert_(image.size[0] <= 400 and image.size[1] <= 300,
+                     image.size)
+        # An image which can't be drafted is refused.
+        source = self.source('PNG')
+        settings.THUMBNAIL_MAX_SOURCE_BYTES = len(source.getvalue()) - 1
+        self.assertEqual(source_generators.pil_image(source), None)
+
+    def test_custom_policy(self):
+        settings.THUMBNAIL_MAX_SOURCE_PIXELS = 1000
+        settings.THUMBNAIL_OVERSIZE_POLICY = (
+            'easy_thumbnails.tests.source_generators.small_oversize')
+        image = source_generators.pil_image(self.source())
+        self.assertEqual(image.size, (10, 10))
+
+    def test_read_metadata(self):
+        source = self.source('PNG', size=(2000, 1000))
+        self.assertEqual(source_generators.read_metadata(source),
+            {'width': 2000, 'height': 1000, 'format': 'PNG', 'mode': 'RGB'})
+        # Only the header was read.
+        self.assert_(source.tell() <= source_generators.HEADER_BYTES)
+        self.assertEqual(
+            source_generators.read_metadata(StringIO('not an image')), None)
+
+    def test_read_metadata_large_header(self):
+        data = self.source().getvalue()
+        # Add an application segment larger than the bytes read at first.
+        padding = 'x' * (source_generators.HEADER_BYTES + 1000)
+        data = (data[:2] + '\xff\xef' + struct.pack('>H', len(padding) + 2) +
+                padding + data[2:])
+        metadata = source_generators.read_metadata(StringIO(data))
+        self.assertEqual((metadata['width'], metadata['height']), (800, 600))
+        self.assertEqual(metadata['format'], 'JPEG')
@@ -10,9 +10,22 @@ from StringIO import StringIO
 from easy_thumbnails.files import get_thumbnailer
 
 
+def lazy_url(thumbnailer, thumbnail_options):
+    return '/lazy/%s' % thumbnailer.get_thumbnail_name(thumbnail_options)
+
+
+def broken_lazy_url(thumbnailer, thumbnail_options):
+    raise ValueError
+
+
+def unknown_lazy_url(thumbnailer, thumbnail_options):
+    return None
+
+
 class ThumbnailTagTest(BaseTest):
     RELATIVE_PIC_NAME = 'test.jpg'
-    restore_settings = ['THUMBNAIL_DEBUG']
+    restore_settings = ['THUMBNAIL_DEBUG', 'THUMBNAIL_LAZY_URL',
+                        'THUMBNAIL_PLACEHOLDER', 'THUMBNAIL_PLACEHOLDER_URL']
 
     def setUp(self):
         BaseTest.setUp(self)
@@ -177,3 +190,71 @@ class ThumbnailTagTest(BaseTest):
             '{% thumbnail source 240x240 sharpen crop quality=95 as thumb %}'
             'width:{{ thumb.width }}, url:{{ thumb.url }}')
         self.assertEqual(output, 'width:240, url:%s' % expected_url)
+
+    def testStaticOptions(self):
+        # Literal options are resolved when the tag is compiled.
+        node = Template('{% load thumbnail %}'
+            '{% thumbnail source 240x240 crop quality=95 %}').nodelist[-1]
+        self.assertEqual(node.opts, {'size': (240, 240), 'crop': True,
+                                     'quality': 95})
+        self.assertEqual(node.variable_opts, [])
+        # Only the variable options are left to resolve when rendering.
+        node = Template('{% load thumbnail %}'
+            '{% thumbnail source size crop quality=q %}').nodelist[-1]
+        self.assertEqual(node.opts, {'crop': True})
+        self.assertEqual(sorted([key for key, value in node.variable_opts]),
+                         ['quality', 'size'])
+        settings.THUMBNAIL_DEBUG = True
+        output = self.render_template(
+            '{% thumbnail source strsize crop quality=95 %}')
+        expected = '%s.80x90_q95_crop.jpg' % self.RELATIVE_PIC_NAME
+        self.verify_thumbnail((80, 90), expected)
+        self.assertEqual(output, ''.join((settings.MEDIA_URL, expected)))
+
+    def testLazyContext(self):
+        expected = '%s.240x240_q85.jpg' % self.RELATIVE_PIC_NAME
+        # The thumbnail isn't generated if the variable isn't used.
+        output = self.render_template(
+            '{% thumbnail source 240x240 as thumb %}'
+            '{% if not_set %}{{ thumb.url }}{% endif %}')
+        self.assertEqual(output, '')
+        self.failIf(self.storage.exists(expected))
+        # A lazy url doesn't need the thumbnail either.
+        settings.THUMBNAIL_LAZY_URL = \
+            'easy_thumbnails.tests.templatetags.lazy_url'
+        output = self.render_template(
+            '{% thumbnail source 240x240 as thumb %}{{ thumb.url }}')
+        self.assertEqual(output, '/lazy/%s' % expected)
+        self.failIf(self.storage.exists(expected))
+        # Using any other attribute gets the thumbnail.
+        output = self.render_template(
+            '{% thumbnail source 240x240 as thumb %}{{ thumb.width }}')
+        self.assertEqual(output, '240')
+        self.assert_(self.storage.exists(expected))
+
+    def testLazyContextError(self):
+        self.storage.save('broken.jpg', ContentFile('not an image'))
+        source = get_thumbnailer(self.storage, 'broken.jpg')
+        source.thumbnail_storage = self.storage
+        template = Template('{% load thumbnail %}'
+            '{% thumbnail source 240x240 as thumb %}'
+            '{% if thumb %}yes{% else %}no{% endif %}:{{ thumb.url }}')
+        self.assertEqual(template.render(Context({'source': source})), 'no:')
+        # Errors building a lazy url are ignored too.
+        settings.THUMBNAIL_DEBUG = False
+        settings.THUMBNAIL_LAZY_URL = \
+            'easy_thumbnails.tests.templatetags.broken_lazy_url'
+        settings.THUMBNAIL_PLACEHOLDER = 'static'
+        settings.THUMBNAIL_PLACEHOLDER_URL = '/static/placeholder.png'
+        self.assertEqual(self.render_template(
+            '{% thumbnail source 240x240 as thumb %}{{ thumb.url }}'),
+            '/static/placeholder.png')
+        # If the lazy url can't be built, the thumbnail is got instead.
+        settings.THUMBNAIL_LAZY_URL = \
+            'easy_thumbnails.tests.templatetags.unknown_lazy_url'
+        self.assertEqual(template.render(Context({'source': source})),
+                         'no:/static/placeholder.png')
+        self.assertEqual(self.render_template(
+            '{% thumbnail source 240x240 as thumb %}{{ thumb.url }}'),
+            '%s%s.240x240_q85.jpg' % (settings.MEDIA_URL,
+                                      self.RELATIVE_PIC_NAME))
@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.urlresolvers import resolve, reverse
+from django.http import Http404
+from django.test.client import RequestFactory
+from django.utils import simplejson
+from easy_thumbnails import utils, views
+from easy_thumbnails.files import LazyThumbnailFile, get_thumbnailer
+from easy_thumbnails.storage import clear_storage_index, get_storages, \
+    get_storage_name
+from easy_thumbnails.tests.fields import TestModel
+from easy_thumbnails.tests.utils import BaseTest, TemporaryStorage
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+from StringIO import StringIO
+import base64
+
+
+class ThumbnailViewTest(BaseTest):
+    urls = 'easy_thumbnails.urls'
+
+    def setUp(self):
+        BaseTest.setUp(self)
+        self.storage = TemporaryStorage()
+        data = StringIO()
+        Image.new('RGB', (800, 600)).save(data, 'JPEG')
+        data.seek(0)
+        self.storage.save('test.jpg', ContentFile(data.read()))
+        # Make the storage known to the view.
+        field = TestModel._meta.get_field('avatar')
+        self.old_storages = field.storage, field.thumbnail_storage
+        field.storage = field.thumbnail_storage = self.storage
+        clear_storage_index()
+
+    def tearDown(self):
+        field = TestModel._meta.get_field('avatar')
+        field.storage, field.thumbnail_storage = self.old_storages
+        clear_storage_index()
+        self.storage.delete_temporary_storage()
+        BaseTest.tearDown(self)
+
+    def thumbnailer(self):
+        thumbnailer = get_thumbnailer(self.storage, 'test.jpg')
+        thumbnailer.thumbnail_storage = self.storage
+        return thumbnailer
+
+    def test_thumbnail_url(self):
+        options = {'size': (100, 100), 'crop': True}
+        url = views.thumbnail_url(self.thumbnailer(), options)
+        self.assertEqual(views.thumbnail_url(self.thumbnailer(), options), url)
+        self.assert_(url.endswith('/test.jpg.100x100_q85_crop.jpg'), url)
+        self.failIf(self.storage.exists('test.jpg.100x100_q85_crop.jpg'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'],
+                         'http://testserver%s' %
+                         self.storage.url('test.jpg.100x100_q85_crop.jpg'))
+        self.assert_('max-age=86400' in response['Cache-Control'])
+        image = Image.open(
+            self.storage.open('test.jpg.100x100_q85_crop.jpg'))
+        self.assertEqual(image.size, (100, 100))
+
+    def test_bad_signature(self):
+        url = views.thumbnail_url(self.thumbnailer(), {'size': (100, 100)})
+        signature = url.split('/')[1]
+        url = url.replace(signature, '0' * 40)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_unknown_storage(self):
+        thumbnailer = self.thumbnailer()
+        thumbnailer.source_storage = TemporaryStorage()
+        thumbnailer.source_storage.save('test.jpg',
+                                        self.storage.open('test.jpg'))
+        try:
+            # An unknown storage can't be used by the view, so no URL is
+            # built and the lazy thumbnail is got straight away instead.
+            self.assertEqual(
+                views.thumbnail_url(thumbnailer, {'size': (100, 100)}), None)
+            self.failIf(self.storage.exists('test.jpg.100x100_q85.jpg'))
+            settings.THUMBNAIL_LAZY_URL = (
+                'easy_thumbnails.views.thumbnail_url')
+            lazy = LazyThumbnailFile(thumbnailer, {'size': (100, 100)})
+            self.assertEqual(lazy.url,
+                             self.storage.url('test.jpg.100x100_q85.jpg'))
+            self.assert_(self.storage.exists('test.jpg.100x100_q85.jpg'))
+        finally:
+            thumbnailer.source_storage.delete_temporary_storage()
+        data = base64.urlsafe_b64encode(simplejson.dumps({
+            'name': 'test.jpg', 'source_storage': 'unknown',
+            'thumbnail_storage': 'default', 'options': {'size': [100, 100]},
+        })).rstrip('=')
+        url = reverse('easy_thumbnails_thumbnail', kwargs={
+            'signature': views.sign(data), 'data': data,
+            'name': 'test.jpg.100x100_q85.jpg'})
+        match = resolve(url)
+        self.assertRaises(Http404, match.func, RequestFactory().get(url),
+                          **match.kwargs)
+
+    def test_storage_instances(self):
+        # Storages of the same class but with different locations.
+        field = TestModel._meta.get_field('avatar')
+        field.thumbnail_storage = TemporaryStorage()
+        clear_storage_index()
+        try:
+            thumbnailer = get_thumbnailer(self.storage, 'test.jpg')
+            thumbnailer.thumbnail_storage = field.thumbnail_storage
+            url = views.thumbnail_url(thumbnailer, {'size': (100, 100)})
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 302)
+            self.assert_(
+                field.thumbnail_storage.exists('test.jpg.100x100_q85.jpg'))
+            self.failIf(self.storage.exists('test.jpg.100x100_q85.jpg'))
+            # Thumbnails of storage hashes shared by differently configured
+            # storages can't be cleaned up.
+            self.failIf(utils.get_storage_hash(self.storage) in
+                        get_storages())
+        finally:
+            field.thumbnail_storage.delete_temporary_storage()
+
+    def test_storage_names(self):
+        field = TestModel._meta.get_field('avatar')
+        self.assertEqual(get_storage_name(self.storage),
+                         '%s.TestModel.avatar' % TestModel._meta.app_label)
+        other = TemporaryStorage(location=self.storage.location)
+        self.assertEqual(get_storage_name(other), None)
+        # The names are only looked for once.
+        field.storage = other
+        self.assertEqual(get_storage_name(field.storage), None)
+        clear_storage_index()
+        self.assertEqual(get_storage_name(field.storage),
+                         '%s.TestModel.avatar' % TestModel._meta.app_label)
+
+    def test_lazy_url(self):
+        settings.THUMBNAIL_LAZY_URL = 'easy_thumbnails.views.thumbnail_url'
+        options = {'size': (100, 100)}
+        lazy = LazyThumbnailFile(self.thumbnailer(), options)
+        self.assertEqual(lazy.url,
+                         views.thumbnail_url(self.thumbnailer(), options))
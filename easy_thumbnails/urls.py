@@ -0,0 +1,6 @@
+from django.conf.urls.defaults import patterns, url
+
+urlpatterns = patterns('easy_thumbnails.views',
+    url(r'^(?P<signature>[0-9a-f]{40})/(?P<data>[-\w]+)/(?P<name>.+)$',
+        'thumbnail', name='easy_thumbnails_thumbnail'),
+)
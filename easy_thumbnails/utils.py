@@ -41,12 +41,36 @@ def valid_processor_options(processors=None):
                       get_setting('SOURCE_GENERATORS')]
     valid_options = set(['size', 'quality'])
     for processor in processors:
-        args = inspect.getargspec(processor)[0]
-        # Add all arguments apart from the first (the source image).
-        valid_options.update(args[1:])
+        valid_options.update(processor_options(processor))
     return list(valid_options)
 
 
+def processor_options(processor):
+    """
+    Return a list of the options which an image processor (or source
+    generator) accepts.
+
+    """
+    args = inspect.getargspec(processor)[0]
+    # All arguments apart from the first (the source image).
+    return args[1:]
+
+
+def active_processor_options(processor):
+    """
+    Return a list of the options which cause an image processor to alter the
+    image, or ``None`` if the processor must always be run.
+
+    A processor declares these via an ``active_options`` attribute, either a
+    list of option names or ``True`` to use all the options it accepts.
+
+    """
+    active_options = getattr(processor, 'active_options', None)
+    if active_options is True:
+        return processor_options(processor)
+    return active_options
+
+
 def get_setting(setting, override=None):
     """
     Get a thumbnail setting from Django settings module, falling back to the
@@ -85,3 +109,12 @@ def get_storage_hash(storage):
         storage_cls = storage.__class__
         storage = '%s.%s' % (storage_cls.__module__, storage_cls.__name__)
     return md5_constructor(storage).hexdigest()
+
+
+def is_transparent(image):
+    """
+    Check to see if a PIL image has an alpha layer or a transparent color.
+
+    """
+    return (image.mode == 'RGBA' or
+            (image.mode == 'P' and 'transparency' in image.info))
@@ -0,0 +1,117 @@
+"""
+A view which gets (generating if needed) thumbnails on demand.
+
+Thumbnail URLs for this view are built by ``thumbnail_url`` without looking
+for the thumbnail, so pages can link to thumbnails without generating them
+first. The URL is signed so that only thumbnails built by the site can be
+generated. Once the thumbnail exists, the view redirects to it.
+
+To use it, include ``easy_thumbnails.urls`` in the project's URLconf and set
+``THUMBNAIL_LAZY_URL = 'easy_thumbnails.views.thumbnail_url'``.
+
+Storages are identified by name (see
+``easy_thumbnails.storage.get_named_storages``), so only the default storages
+and the storages of model file fields can be used.
+
+"""
+from django.core.urlresolvers import reverse
+from django.http import Http404, HttpResponseForbidden, HttpResponseRedirect
+from django.utils import simplejson
+from django.utils.cache import patch_response_headers
+from django.utils.crypto import constant_time_compare, salted_hmac
+from easy_thumbnails import utils
+from easy_thumbnails.files import get_thumbnailer
+from easy_thumbnails.storage import get_named_storage, get_storage_name
+import base64
+
+
+def sign(value):
+    """
+    Return the signature of a string (keyed by the ``SECRET_KEY`` setting).
+
+    """
+    return salted_hmac('easy_thumbnails.views', value).hexdigest()
+
+
+def encode_thumbnail(thumbnailer, thumbnail_options):
+    """
+    Return the thumbnail source, storage names and options, encoded for a
+    URL (or ``None`` if either storage isn't a known storage).
+
+    The same thumbnail always gives the same encoded string.
+
+    """
+    source_storage = get_storage_name(thumbnailer.source_storage)
+    thumbnail_storage = get_storage_name(thumbnailer.thumbnail_storage)
+    if source_storage is None or thumbnail_storage is None:
+        return
+    data = simplejson.dumps({
+        'name': thumbnailer.name,
+        'source_storage': source_storage,
+        'thumbnail_storage': thumbnail_storage,
+        'options': thumbnail_options,
+    }, sort_keys=True, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data).rstrip('=')
+
+
+def decode_thumbnail(data):
+    """
+    Return the dictionary encoded by ``encode_thumbnail``.
+
+    """
+    data = str(data)
+    data = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+    return simplejson.loads(data)
+
+
+def thumbnail_url(thumbnailer, thumbnail_options):
+    """
+    Return the signed URL of the ``thumbnail`` view for a thumbnail.
+
+    The URL ends with the thumbnail's name, so it has the right extension.
+
+    ``None`` is returned if the thumbnailer's storages aren't known to the
+    view (``LazyThumbnailFile`` then gets the thumbnail instead).
+
+    """
+    data = encode_thumbnail(thumbnailer, thumbnail_options)
+    if data is None:
+        return
+    return reverse('easy_thumbnails_thumbnail', kwargs={
+        'signature': sign(data), 'data': data,
+        'name': thumbnailer.get_thumbnail_name(thumbnail_options)})
+
+
+def thumbnail(request, signature, data, name):
+    """
+    Redirect to a thumbnail, generating it first if it doesn't exist yet.
+
+    The redirect can be cached for the number of seconds set by the
+    ``THUMBNAIL_VIEW_CACHE_SECONDS`` setting.
+
+    """
+    if not constant_time_compare(sign(data), signature):
+        return HttpResponseForbidden()
+    try:
+        data = decode_thumbnail(data)
+    except (TypeError, ValueError):
+        raise Http404
+    source_storage = get_named_storage(data['source_storage'])
+    thumbnail_storage = get_named_storage(data['thumbnail_storage'])
+    if source_storage is None or thumbnail_storage is None:
+        raise Http404
+    options = dict([(str(key), value)
+                    for key, value in data['options'].items()])
+    options['size'] = tuple(options['size'])
+    try:
+        thumbnailer = get_thumbnailer(source_storage, data['name'])
+        thumbnailer.thumbnail_storage = thumbnail_storage
+        thumbnail = thumbnailer.get_thumbnail(options)
+    except Exception:
+        if utils.get_setting('DEBUG'):
+            raise
+        raise Http404
+    response = HttpResponseRedirect(thumbnail.url)
+    patch_response_headers(response,
+                           utils.get_setting('VIEW_CACHE_SECONDS'))
+    return response